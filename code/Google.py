@@ -1,49 +1,155 @@
 import pickle
 import datetime
+import json
 import os
+
+import httplib2
+from google_auth_httplib2 import AuthorizedHttp
 from google_auth_oauthlib.flow import InstalledAppFlow  # , Flow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
+from googleapiclient.discovery_cache import get_static_doc
 from google.auth.transport.requests import Request
 
-
 # from googleapiclient.http import MediaFileUpload
 
-def Create_Service(client_secret_file, api_name, api_version, *scopes):
-    print(client_secret_file, api_name, api_version, scopes, sep='-')
-    CLIENT_SECRET_FILE = client_secret_file
-    API_SERVICE_NAME = api_name
-    API_VERSION = api_version
-    SCOPES = list(scopes[0])
-    print(SCOPES)
+discovery_folder = '../files/discovery/'
+discovery_url = 'https://www.googleapis.com/discovery/v1/apis/{api}/{apiVersion}/rest'
 
-    cred = None
+# One service per (API, version, endpoint) and one authorized HTTP session per token,
+# shared by the whole run.
+services = {}
+sessions = {}
 
-    pickle_file = f'token_{API_SERVICE_NAME}_{API_VERSION}.pickle'
-    # print(pickle_file)
 
-    if os.path.exists(pickle_file):
-        with open(pickle_file, 'rb') as token:
-            cred = pickle.load(token)
+def Create_Service(client_secret_file, api_name, api_version, *scopes, api_endpoint=None,
+                   credentials=None):
+    """
+    A function to get a Google API service, built once per run.
 
-    if not cred or not cred.valid:
-        if cred and cred.expired and cred.refresh_token:
-            cred.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CLIENT_SECRET_FILE, SCOPES)
-            cred = flow.run_local_server()
+    :param client_secret_file: OAuth client secret file.
+    :param api_name: Name of the API (e.g. 'YouTube').
+    :param api_version: Version of the API (e.g. 'v3').
+    :param scopes: A list of OAuth scopes.
+    :param api_endpoint: Root URL replacing the Google one (e.g. a local stand-in); without
+    'credentials', requests to it are not authorized.
+    :param credentials: Credentials to use instead of the pickled OAuth token.
+    :return: The service, or None if it couldn't be built.
+    """
+
+    key = (api_name.lower(), api_version, api_endpoint)
 
-        with open(pickle_file, 'wb') as token:
-            pickle.dump(cred, token)
+    if key in services:
+        return services[key]
 
     try:
-        service = build(API_SERVICE_NAME, API_VERSION, credentials=cred)
-        print(API_SERVICE_NAME, 'service created successfully')
-        return service
+        document = discovery_document(api_name, api_version)
+
+        if api_endpoint is not None:
+            document['rootUrl'] = api_endpoint.rstrip('/') + '/'
+
+        if credentials is None and api_endpoint is not None:
+            http = httplib2.Http(timeout=30)
+        else:
+            http = authorized_session(client_secret_file, api_name, api_version,
+                                      list(scopes[0]), credentials)
+
+        services[key] = build_from_document(document, http=http)
+        print(api_name, 'service created successfully')
+        return services[key]
+
     except Exception as e:
         print(e)
         return None
 
 
+def authorized_session(client_secret_file, api_name, api_version, scopes,
+                       credentials=None):
+    """
+    A function to get the authorized HTTP session of a token, created once per run: its
+    connections are kept alive and reused by every request of the run.
+
+    :param client_secret_file: OAuth client secret file.
+    :param api_name: Name of the API.
+    :param api_version: Version of the API.
+    :param scopes: A list of OAuth scopes.
+    :param credentials: Credentials to use instead of the pickled OAuth token.
+    :return: An authorized 'httplib2.Http'.
+    """
+
+    pickle_file = f'token_{api_name}_{api_version}.pickle'
+    key = id(credentials) if credentials is not None else pickle_file
+
+    if key not in sessions:
+        cred = credentials or load_credentials(client_secret_file, pickle_file, scopes)
+        sessions[key] = AuthorizedHttp(cred, http=httplib2.Http(timeout=30))
+
+    return sessions[key]
+
+
+def discovery_document(api_name, api_version):
+    """
+    A function to get the discovery document of an API without downloading it at each
+    run: a copy saved in 'discovery_folder' first, then the one shipped with
+    googleapiclient, and only then the online one (saved for the next runs).
+
+    :param api_name: Name of the API.
+    :param api_version: Version of the API.
+    :return: The discovery document (dictionary).
+    """
+
+    path = os.path.join(discovery_folder, f'{api_name.lower()}_{api_version}.json')
+
+    if os.path.exists(path):
+        with open(path, encoding='utf8') as document_file:
+            return json.load(document_file)
+
+    content = get_static_doc(api_name.lower(), api_version)
+
+    if content is None:
+        _, content = httplib2.Http(timeout=30).request(
+            discovery_url.format(api=api_name.lower(), apiVersion=api_version))
+        content = content.decode('utf-8')
+
+    os.makedirs(discovery_folder, exist_ok=True)
+
+    with open(path, 'w', encoding='utf8') as document_file:
+        document_file.write(content)
+
+    return json.loads(content)
+
+
+def load_credentials(client_secret_file, pickle_file, scopes):
+    """
+    A function to load the pickled OAuth token: a valid token is used as it is, an expired
+    one is refreshed, and the OAuth flow only runs when there is no usable token.
+
+    :param client_secret_file: OAuth client secret file.
+    :param pickle_file: File of the pickled token.
+    :param scopes: A list of OAuth scopes.
+    :return: The credentials.
+    """
+
+    cred = None
+
+    if os.path.exists(pickle_file):
+        with open(pickle_file, 'rb') as token:
+            cred = pickle.load(token)
+
+    if cred and cred.valid:
+        return cred
+
+    if cred and cred.expired and cred.refresh_token:
+        cred.refresh(Request())
+    else:
+        flow = InstalledAppFlow.from_client_secrets_file(client_secret_file, scopes)
+        cred = flow.run_local_server()
+
+    with open(pickle_file, 'wb') as token:
+        pickle.dump(cred, token)
+
+    return cred
+
+
 def convert_to_RFC_datetime(year=1900, month=1, day=1, hour=0, minute=0):
     dt = datetime.datetime(year, month, day, hour, minute, 0).isoformat() + 'Z'
     return dt
@@ -0,0 +1,343 @@
+# -*- coding: utf-8 -*-
+
+from datetime import date
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from metrics import run_metrics
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: aggregation.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Compute the statistics by track, by artist and by label of any release date
+window (all time, ISO week, month, quarter, year, rolling days...), without scanning the
+whole catalog for each of them.
+
+- Summary -
+
+1. Store artists and labels as categoricals and the statistics as compact integers.
+2. Split each distinct artist (label) string once into a sparse incidence matrix:
+   track x artist (label), the number of times the track credits it.
+3. Sort the tracks by release date and keep, for each artist (label), the cumulative sums
+   of the metrics of its tracks in that order (prefix sums).
+4. Answer a window with two binary searches: the sums of an entity over the window are the
+   difference of its prefix sums at both ends.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+metric_columns = ['YouTube_Views', '1001T_TotPlays', '1001T_Supports', 'Soundcloud_Plays']
+
+entity_columns = {'artist': 'Artist', 'label': 'Label'}
+
+skipped_entities = {'label': 'NONE'}  # Tracks without label are not charted as a label
+
+""" - LOCAL CLASSES - """
+
+
+class ReleaseIndex:
+    """
+    Tracks sorted by release date, with the prefix sums of their metrics by artist and by
+    label, to compute the tables of any window.
+    """
+
+    def __init__(self, by_track):
+        """
+        :param by_track: A dataframe of tracks with their statistics (from 'get_data').
+        """
+
+        self.by_track = compact_tracks(by_track)
+        self.metrics = [column for column in metric_columns if column in
+                        self.by_track.columns]
+
+        release_dates = self.by_track.Release_Date.sort_values(kind='stable',
+                                                               na_position='last')
+        self.order = self.by_track.index.get_indexer(release_dates.index)
+        self.dates = release_dates.dropna().to_numpy('datetime64[ns]')
+
+        metrics = self.by_track[self.metrics]
+        values = np.column_stack([metrics.to_numpy('int64', na_value=0),
+                                  metrics.notna().to_numpy('int64'),
+                                  np.ones(len(self.by_track), dtype='int64')])[self.order]
+
+        self.prefix_sums = {}
+
+        for entity_type, column in entity_columns.items():
+            incidence, names = entity_incidence(self.by_track[column],
+                                                skipped_entities.get(entity_type))
+            self.prefix_sums[entity_type] = (*prefix_sums(incidence, self.order, values),
+                                             names)
+
+    def bounds(self, start=None, end=None):
+        """
+        A method to find the tracks of a window in the release date order.
+
+        :param start: First day of the window, None for all time.
+        :param end: Last day of the window (included), None for all time.
+        :return: Positions of the first track of the window and after the last one.
+        """
+
+        if start is None and end is None:
+            return 0, len(self.order)
+
+        start, stop = pd.Timestamp(start), pd.Timestamp(end) + pd.Timedelta(days=1)
+
+        return tuple(np.searchsorted(self.dates, np.array([start, stop],
+                                                          dtype='datetime64[ns]')))
+
+    def entity_table(self, entity_type, start=None, end=None):
+        """
+        A method to sum the metrics of every artist (label) over a window.
+
+        :param entity_type: 'artist' or 'label'.
+        :param start: First day of the window, None for all time.
+        :param end: Last day of the window (included), None for all time.
+        :return: A dataframe of the sums, indexed by the entities having at least one
+        track in the window (sorted by name). Unknown statistics (not collected) are left
+        out of the sums, a sum without any known statistic is missing.
+        """
+
+        keys, cumulated, names = self.prefix_sums[entity_type]
+        first, after = self.bounds(start, end)
+        rows = np.arange(len(names), dtype='int64') * len(self.order)
+        sums = cumulated[np.searchsorted(keys, rows + after)] - \
+            cumulated[np.searchsorted(keys, rows + first)]
+        charted = sums[:, -1] > 0
+        unknown = sums[charted, len(self.metrics):-1] == 0
+
+        table = pd.DataFrame(sums[charted, :len(self.metrics)], columns=self.metrics,
+                             index=pd.Index(names[charted], dtype=object,
+                                            name=entity_columns[entity_type]))
+
+        return table.astype('Int64').mask(unknown) if unknown.any() else table
+
+    def tables(self, start=None, end=None):
+        """
+        A method to compute the tables of a window.
+
+        :param start: First day of the window, None for all time.
+        :param end: Last day of the window (included), None for all time.
+        :return: Tables by track, by artist and by label.
+        """
+
+        return self.track_table(start, end), self.entity_table('artist', start, end), \
+            self.entity_table('label', start, end)
+
+    def track_table(self, start=None, end=None):
+        """
+        A method to select the tracks released in a window.
+
+        :param start: First day of the window, None for all time.
+        :param end: Last day of the window (included), None for all time.
+        :return: A dataframe of tracks, in the order of the catalog.
+        """
+
+        first, after = self.bounds(start, end)
+
+        return self.by_track.iloc[np.sort(self.order[first:after])]
+
+
+""" - LOCAL FUNCTIONS - """
+
+
+@run_metrics.timed('aggregation')
+def aggregate(by_track, week_day_start, week_day_end, month_number, month_year=None):
+    """
+    A function to compute the tables of every period exported.
+
+    :param by_track: A dataframe of tracks with their statistics (from 'get_data').
+    :param week_day_start: First day of the week.
+    :param week_day_end: Last day of the week.
+    :param month_number: Months 1 to 'month_number' of 'month_year' are computed.
+    :param month_year: Year of the months, the calendar year of 'week_day_end' by default
+    (not the ISO year of the week, see function 'iso_year').
+    :return: A dictionary associating (entity type, period) and a table, where entity type
+    is 'track', 'artist' or 'label' and period 'all_time', 'week' or 'month_<n>'. Track
+    tables keep every column, artist and label tables hold the sums of the metrics.
+    """
+
+    index = ReleaseIndex(by_track)
+    month_year = pd.Timestamp(week_day_end).year if month_year is None else month_year
+
+    windows = {'all_time': (None, None), 'week': (week_day_start, week_day_end),
+               **{f'month_{m}': month_window(month_year, m)
+                  for m in range(1, month_number + 1)}}
+    tables = {}
+
+    for period, (start, end) in windows.items():
+        tables['track', period], tables['artist', period], tables['label', period] = \
+            index.tables(start, end)
+
+    return tables
+
+
+def compact_tracks(by_track):
+    """
+    A function to store a dataframe of tracks compactly: artists and labels as
+    categoricals (each distinct string kept once), statistics as the smallest integer type
+    holding them.
+
+    :param by_track: A dataframe of tracks with their statistics.
+    :return: A compact copy of the dataframe (missing artists and labels become 'NONE').
+    """
+
+    by_track = by_track.copy()
+
+    for column in entity_columns.values():
+        by_track[column] = by_track[column].astype(object).fillna('NONE').astype('category')
+
+    for column in metric_columns:
+        if column in by_track.columns and pd.api.types.is_integer_dtype(by_track[column]):
+            by_track[column] = pd.to_numeric(by_track[column], downcast='integer')
+
+    return by_track
+
+
+def entity_incidence(entities, skipped=None):
+    """
+    A function to build the incidence matrix of tracks and artists (or labels), splitting
+    each distinct comma-joined string only once.
+
+    :param entities: A categorical series of comma-joined artists (or labels), one per
+    track, without missing values.
+    :param skipped: An entity left out of the matrix (e.g. 'NONE'), None to keep them all.
+    :return: A sparse matrix (tracks x entities, number of times each track credits each
+    entity) and the names of the entities, sorted.
+    """
+
+    split = pd.Series(entities.cat.categories).str.split(', ').explode()
+
+    if skipped is not None:
+        split = split.loc[split != skipped]
+
+    entity_codes, names = pd.factorize(split, sort=True)
+    by_category = sparse.csr_matrix((np.ones(len(split), dtype='int64'),
+                                     (split.index.to_numpy(), entity_codes)),
+                                    shape=(len(entities.cat.categories), len(names)))
+
+    return by_category[entities.cat.codes.to_numpy()], np.asarray(names, dtype=object)
+
+
+def iso_year(day):
+    """
+    A function to get the ISO year of a day, that of its week (e.g. 2021 for 2022-01-02,
+    last day of 2021-W52).
+
+    :param day: A day ('YYYY-MM-DD').
+    :return: The ISO year.
+    """
+
+    return date.fromisoformat(str(day)[:10]).isocalendar()[0]
+
+
+def iso_week_window(year, week):
+    """
+    A function to get the days of an ISO week.
+
+    :param year: ISO year.
+    :param week: ISO week number (1 to 52 or 53).
+    :return: First day (Monday) and last day (Sunday) of the week.
+    """
+
+    monday = pd.Timestamp(date.fromisocalendar(year, week, 1))
+
+    return monday, monday + pd.Timedelta(days=6)
+
+
+def month_window(year, month):
+    """
+    A function to get the days of a month.
+
+    :param year: Year of the month.
+    :param month: Number of the month (1 to 12).
+    :return: First and last day of the month.
+    """
+
+    first = pd.Timestamp(year=year, month=month, day=1)
+
+    return first, first + pd.offsets.MonthEnd(0)
+
+
+def period_tables(tables, period):
+    """
+    A function to get the tables of a single period.
+
+    :param tables: From function 'aggregate'.
+    :param period: 'all_time', 'week' or 'month_<n>'.
+    :return: Tables by track, by artist and by label.
+    """
+
+    return tables['track', period], tables['artist', period], tables['label', period]
+
+
+def prefix_sums(incidence, order, values):
+    """
+    A function to compute, for each entity, the cumulative sums of the values of its
+    tracks in release date order.
+
+    :param incidence: A sparse matrix tracks x entities (from function 'entity_incidence').
+    :param order: Positions of the tracks, sorted by release date.
+    :param values: Values to sum (metrics, whether they are known and a column of ones),
+    in release date order.
+    :return: The sorted keys of the (entity, track) pairs ('entity * tracks + position')
+    and the cumulative sums of the values along the keys (starting by a row of zeros).
+    """
+
+    by_entity = incidence[order].T.tocsr()
+    by_entity.sort_indices()
+
+    entities = np.repeat(np.arange(by_entity.shape[0], dtype='int64'),
+                         np.diff(by_entity.indptr))
+    keys = entities * len(order) + by_entity.indices
+    credited = by_entity.data[:, None] * values[by_entity.indices]
+    cumulated = np.vstack([np.zeros((1, values.shape[1]), dtype='int64'),
+                           np.cumsum(credited, axis=0)])
+
+    return keys, cumulated
+
+
+def quarter_window(year, quarter):
+    """
+    A function to get the days of a quarter.
+
+    :param year: Year of the quarter.
+    :param quarter: Number of the quarter (1 to 4).
+    :return: First and last day of the quarter.
+    """
+
+    first = pd.Timestamp(year=year, month=3 * quarter - 2, day=1)
+
+    return first, first + pd.offsets.QuarterEnd(0)
+
+
+def rolling_window(end, days=28):
+    """
+    A function to get the days of a rolling window.
+
+    :param end: Last day of the window.
+    :param days: Length of the window, in days.
+    :return: First and last day of the window.
+    """
+
+    end = pd.Timestamp(end)
+
+    return end - pd.Timedelta(days=days - 1), end
+
+
+def year_window(year):
+    """
+    A function to get the days of a year.
+
+    :param year: The year.
+    :return: First and last day of the year.
+    """
+
+    first = pd.Timestamp(year=year, month=1, day=1)
+
+    return first, first + pd.offsets.YearEnd(0)
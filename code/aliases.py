@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+
+from metrics import run_metrics
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: aliases.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Credit the tracks of an artist's alias (or group) to the artist(s) behind it.
+
+- Summary -
+
+1. 'alias': groups and aliases, credited to their members / the artist behind them.
+2. 'weak_alias': side projects and spellings, credited to the main artist name.
+3. 'find_alias' appends the names behind each alias to the artists of a track.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+alias = {"PBH & Jack": "PBH & Jack Shizzle", "Daffy Muffin": "Lucas & Steve",
+         "AREA21": ["Martin Garrix", "Maejor"], "Ytram": "Martin Garrix",
+         "Major Lazer": ["Diplo", "Walshy Fire", "Ape Drums"],
+         "Big Pineapple": "Don Diablo", "VIRTUAL SELF": "Porter Robinson",
+         "Streex": "Razihel", "Jack Ü": ["Skrillex", "Diplo"], "NWYR": "W&W",
+         "Axwell Λ Ingrosso": ["Sebastian Ingrosso", "Axwell"], "Bastille": "Dan Smith",
+         "Dan Smith": "Bastille",
+         "Swedish House Mafia": ["Axwell", "Sebastian Ingrosso", "Steve Angello"],
+         "Jeffrey Sutorius": "Dash Berlin", "Shindeai": ["STARRYSKY", "Tai Wuang"],
+         "Sasha": "STARRYSKY", "Casseurs Flowters": ["OrelSan", "Gringe"],
+         "Sinnoh Fusion Ensemble": "insaneintherainmusic",
+         "Destroid": ["Excision", "Far Too Loud"],
+         "Jaxxwell": ["Hardwell", "Blasterjaxx"]}
+
+weak_alias = {"AvB": "Armin van Buuren", "Rising Star": "Armin van Buuren",
+              "NLW": "Afrojack", "GRX": "Martin Garrix", "Jayden Jaxx": "Crime Zcene",
+              "Chill Harris": "Kill Paris", "DJ Afrojack": "Afrojack",
+              "Ravitez": "Chico Rose", "Kerafix & Vultaire": "KEVU",
+              "Lush & Simon": ["Simon Says", "Zen/It"], "Matthew Ros": "MWRS",
+              "Grant Bowtie": "Grant", "M.E.G. & N.E.R.A.K.": "DJ M.E.G.",
+              "MEG / NERAK": "DJ M.E.G.", "Dzeko & Torres": "Dzeko",
+              "X-Teef": "Stemalø", "Juventa": "Jordin Post",
+              "Paris & Simo": "Prince Paris", "The Eden Project": "EDEN",
+              "Astra": "ASHWYN", "Slips & Slurs": "Slippy",
+              "Vorwerk": "Maarten Vorwerk", "Will & Tim": "NewGamePlus",
+              "DBSTF": "D-Block & S-te-Fan", "Maître Gims": "GIMS", "Muzzy": "MUZZ",
+              "Richard Caddock": "Keepsake", "Joey Rumble": "Modern Revolt",
+              "Michelle McKenna": "Michelle Platnum", "Ben Lepper": "Cloud Cage"}
+
+# Aliases appended after each artist (when both apply, 'weak_alias' wins over 'alias')
+alias_suffixes = {artist: ''.join(f', {an_alias}' for an_alias in
+                                  (aliases if isinstance(aliases, list) else [aliases]))
+                  for artist, aliases in {**alias, **weak_alias}.items()}
+
+""" - LOCAL FUNCTIONS - """
+
+
+@run_metrics.timed('find_alias')
+def find_alias(dataframe):
+    """
+    A function to find alis among artists' names.
+
+    :param dataframe: A reference dataframe.
+    :return: Augmented dataframe with alias.
+    """
+
+    artists = dataframe.Artist.str.split(', ').explode()
+    suffixes = artists.map(alias_suffixes).dropna() \
+        .groupby(level=0, sort=False).agg(''.join)
+
+    dataframe.Artist = dataframe.Artist + suffixes.reindex(dataframe.index, fill_value='')
+
+    return dataframe
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import os
+import re
+from time import perf_counter
+from timeit import repeat
+
+import numpy as np
+import pandas as pd
+from bs4 import BeautifulSoup
+
+import data_collection as dc
+import extractors
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: benchmarks.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Time the steps of the pipeline that can be run offline, to check a change
+doesn't make the weekly run slower.
+
+- Summary -
+
+1. Page extraction: full BeautifulSoup parse (before) vs. targeted patterns (after),
+   over the pages saved in 'files/page_fixtures'.
+2. Alias expansion: row by row (before) vs. vectorized (after), on a synthetic catalog.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+fixtures_folder = '../files/page_fixtures/'
+
+# Share of tracks with a value in each optional column (as in '2021 Charts IN.xlsx').
+catalog_fill_rates = {'Label': .87, 'YouTube_ID1': .99, 'YouTube_ID2': .97,
+                      'YouTube_ID3': .47, 'YouTube_ID4': .13, '1001Tracklists_ID': .77,
+                      'Soundcloud_Link1': .9, 'Soundcloud_Link2': .13}
+
+catalog_genres = ['Big Room', 'Future Bass', 'House', 'Progressive House', 'Techno',
+                  'Trance', 'Dubstep', 'Drum & Bass']
+
+""" - LOCAL FUNCTIONS - """
+
+
+def benchmark_extractors(folder=fixtures_folder, number=20, repetitions=5):
+    """
+    A function to compare per-page parse time of the old and new extraction.
+
+    :param folder: Folder of the saved pages ('1001tracklists_*.html', 'soundcloud_*.html').
+    :param number: Number of parses per timing.
+    :param repetitions: Number of timings, the best one is kept.
+    :return: A list of dictionaries (fixture, result, time before and after in ms).
+    """
+
+    results = []
+
+    for file_name in sorted(os.listdir(folder)):
+        with open(os.path.join(folder, file_name), 'rb') as fixture:
+            content = fixture.read()
+
+        if file_name.startswith('1001tracklists'):
+            before, after = legacy_1001tracklists, extractors.extract_1001tracklists
+        elif file_name.startswith('soundcloud'):
+            before, after = legacy_soundcloud_plays, extractors.extract_soundcloud_plays
+        else:
+            continue
+
+        if before(content) != after(content):
+            raise AssertionError(f'{file_name}: {before(content)} != {after(content)}')
+
+        time_before = min(repeat(lambda: before(content), number=number,
+                                 repeat=repetitions)) / number
+        time_after = min(repeat(lambda: after(content), number=number,
+                                repeat=repetitions)) / number
+
+        results.append({'fixture': file_name, 'result': after(content),
+                        'before_ms': time_before * 1000, 'after_ms': time_after * 1000})
+
+    return results
+
+
+def benchmark_find_alias(rows=100_000, seed=0):
+    """
+    A function to compare the old and new alias expansion on a synthetic catalog.
+
+    :param rows: Number of tracks in the catalog.
+    :param seed: Seed of the random catalog.
+    :return: A dictionary (rows, time before and after in seconds).
+    """
+
+    catalog = synthetic_catalog(rows, seed)
+
+    start = perf_counter()
+    expected = legacy_find_alias(catalog.copy())
+    time_before = perf_counter() - start
+
+    start = perf_counter()
+    result = dc.find_alias(catalog.copy())
+    time_after = perf_counter() - start
+
+    if not result.Artist.equals(expected.Artist):
+        raise AssertionError('Vectorized alias expansion differs from the row by row one.')
+
+    return {'rows': rows, 'before_s': time_before, 'after_s': time_after}
+
+
+def legacy_1001tracklists(content):
+    """
+    Former extraction of 'get_1001tracklists_track_data' (full BeautifulSoup parse).
+
+    :param content: The raw page (bytes).
+    :return: a list [Unique DJ Supports, Plays], or None if the IP has been blocked.
+    """
+
+    soup = BeautifulSoup(content, "html.parser")
+
+    if 'Your IP has been blocked due to abnormal use.' in soup.text:
+        return None
+
+    try:
+        supports = soup.find_all("span", class_='badge spR',
+                                 title="total unique DJ supports")[0]
+        int_supp = int(re.sub('<.*?>', '', str(supports)).replace('x', ''))
+    except IndexError:
+        int_supp = int(0)
+
+    try:
+        tot_play = soup.find_all("div", class_="c",
+                                 text=re.compile('Total Tracklist Plays:.'))[0]
+        int_play = int(re.sub('<.*?>', '', str(tot_play))
+                       .replace('x', '')
+                       .replace('Total Tracklist Plays: ', ''))
+    except IndexError:
+        int_play = int(1)
+
+    return int_supp, int_play
+
+
+def legacy_find_alias(dataframe):
+    """
+    Former 'find_alias' (row by row, one indexed write per alias).
+
+    :param dataframe: A reference dataframe.
+    :return: Augmented dataframe with alias.
+    """
+
+    for an_idx, a_row in dataframe.iterrows():
+        artists = a_row.Artist.split(', ')
+        for artist in artists:
+            if artist in dc.weak_alias.keys():
+                if isinstance(dc.weak_alias[artist], list):
+                    for an_alias in dc.weak_alias[artist]:
+                        dataframe.loc[an_idx, 'Artist'] += f', {an_alias}'
+                else:
+                    dataframe.loc[an_idx, 'Artist'] += f', {dc.weak_alias[artist]}'
+            elif artist in dc.alias.keys():
+                if isinstance(dc.alias[artist], list):
+                    for an_alias in dc.alias[artist]:
+                        dataframe.loc[an_idx, 'Artist'] += f', {an_alias}'
+                else:
+                    dataframe.loc[an_idx, 'Artist'] += f', {dc.alias[artist]}'
+    return dataframe
+
+
+def legacy_soundcloud_plays(content):
+    """
+    Former extraction of 'soundcloud_scrapping' (full BeautifulSoup parse).
+
+    :param content: The raw page (bytes).
+    :return: Number of plays of the track.
+    """
+
+    soup = BeautifulSoup(content, "html.parser")
+    plays = str(soup.find_all("meta", property="soundcloud:play_count")[0])
+
+    return int(re.search('meta content="(.+?)"', plays).group(1))
+
+
+def synthetic_catalog(rows, seed=0):
+    """
+    A function to build a random catalog shaped like '2021 Charts IN.xlsx'.
+
+    Artists and labels follow a long-tail distribution (a few of them release most
+    tracks), aliased artists are drawn more often, and platform IDs are filled at the
+    rates of the real catalog ('catalog_fill_rates').
+
+    :param rows: Number of tracks.
+    :param seed: Seed of the random generator.
+    :return: A dataframe of tracks (same columns as '2021 Charts IN.xlsx').
+    """
+
+    rng = np.random.default_rng(seed)
+    aliased = list(dc.alias) + list(dc.weak_alias)
+    artists = np.array(aliased + [f'Artist {i}' for i in range(max(rows // 5, 1))])
+    labels = np.array([f'Label {i}' for i in range(max(rows // 50, 1))])
+
+    # Long tail: the n-th artist (label) is drawn about 1/n as often as the first one.
+    # Aliased artists fill 5% of the artist slots (about 2% in the real catalog).
+    weights = 1 / np.arange(1, len(artists) - len(aliased) + 1) ** .8
+    weights = np.concatenate([np.full(len(aliased), .05 / len(aliased)),
+                              weights / weights.sum() * .95])
+    label_weights = 1 / np.arange(1, len(labels) + 1)
+    label_weights /= label_weights.sum()
+
+    # Most tracks have one or two artists.
+    n_artists = rng.choice([1, 2, 3, 4], size=rows, p=[.55, .3, .1, .05])
+    drawn = rng.choice(artists, size=n_artists.sum(), p=weights)
+    bounds = np.concatenate([[0], np.cumsum(n_artists)])
+    numbers = np.arange(rows)
+
+    catalog = pd.DataFrame({
+        'Artist': [', '.join(drawn[bounds[i]:bounds[i + 1]]) for i in range(rows)],
+        'Track_Name': [f'Track {i}' for i in range(rows)],
+        'Label': rng.choice(labels, size=rows, p=label_weights),
+        'Genre': rng.choice(catalog_genres, size=rows),
+        'Release_Date': pd.Timestamp('2021-01-01') + pd.to_timedelta(
+            rng.integers(0, 365, size=rows), unit='D'),
+        'YouTube_ID1': pd.Series(numbers).map('Y1{:09d}'.format),
+        'YouTube_ID2': pd.Series(numbers).map('Y2{:09d}'.format),
+        'YouTube_ID3': pd.Series(numbers).map('Y3{:09d}'.format),
+        'YouTube_ID4': pd.Series(numbers).map('Y4{:09d}'.format),
+        '1001Tracklists_ID': pd.Series(numbers).map('{:08x}'.format),
+        'Soundcloud_Link1': pd.Series(numbers).map('artist-{0}/track-{0}'.format),
+        'Soundcloud_Link2': pd.Series(numbers).map('artist-{0}/track-{0}-remix'.format)})
+
+    for column, rate in catalog_fill_rates.items():
+        catalog[column] = catalog[column].where(rng.random(rows) < rate)
+
+    return catalog
+
+
+" - MAIN PART -"
+
+if __name__ == '__main__':
+    print(f'{"Fixture":<40}{"Result":>14}{"Before (ms)":>14}{"After (ms)":>14}{"Speed-up":>10}')
+
+    for a_result in benchmark_extractors():
+        print(f'{a_result["fixture"]:<40}{str(a_result["result"]):>14}'
+              f'{a_result["before_ms"]:>14.3f}{a_result["after_ms"]:>14.3f}'
+              f'{a_result["before_ms"] / a_result["after_ms"]:>9.0f}x')
+
+    alias_result = benchmark_find_alias()
+    print(f'\nfind_alias on {alias_result["rows"]} rows: {alias_result["before_s"]:.2f} s '
+          f'-> {alias_result["after_s"]:.2f} s')
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+
+import argparse
+import io
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+import ranking
+from page_cache import write_atomic
+from report_writer import build_iterators
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: chart_dataset.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Keep every chart exported in a single Parquet dataset, next to the Excel
+workbooks, so a chart or the history of an artist is read without parsing whole
+workbooks.
+
+- Summary -
+
+1. Each chart (platform x entity x period) is written, ranked, in its own partition:
+   'platform=<platform>/entity=<entity>/period=<period>/part-0.parquet'.
+2. Rows are sorted by rank and split in row groups: the top of a chart only reads the
+   first row groups, and only the columns asked are read.
+3. 'read_chart' returns a single chart, 'artist_history' the positions of an artist over
+   the periods (also from the command line).
+
+Periods: '<year>-W<week>' (weekly charts), '<year>-<month>' (monthly charts) and
+'all_time-<year>-W<week>' (all time charts, as exported that week).
+
+Usage (from the 'code' folder):
+    - python chart_dataset.py chart YouTube Artist 2021-W21 --top 10
+    - python chart_dataset.py history "Martin Garrix" --platform Soundcloud
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+dataset_folder = '../files/charts_dataset/'
+
+rows_per_group = 1_000
+
+platform_metrics = {'YouTube': ['YouTube_Views'],
+                    '1001Tracklists': ['1001T_Supports', '1001T_TotPlays'],
+                    'Soundcloud': ['Soundcloud_Plays']}
+
+text_columns = ['name', 'Artist', 'Track_Name', 'Label']
+
+file_schema = pa.schema([('rank', pa.int32())] +
+                        [(column, pa.string()) for column in text_columns] +
+                        [(metric, pa.int64()) for metrics in platform_metrics.values()
+                         for metric in metrics])
+
+partition_schema = pa.schema([('platform', pa.string()), ('entity', pa.string()),
+                              ('period', pa.string())])
+
+period_patterns = {'week': r'\d{4}-W\d{2}', 'month': r'\d{4}-\d{2}',
+                   'all_time': r'all_time-\d{4}-W\d{2}'}
+
+""" - LOCAL FUNCTIONS - """
+
+
+def artist_history(artist, platform=None, kind='week', folder=dataset_folder):
+    """
+    A function to get the positions of an artist in every chart of a kind of period.
+
+    :param artist: Name of the artist.
+    :param platform: 'YouTube', '1001Tracklists' or 'Soundcloud', None for all of them.
+    :param kind: 'week', 'month' or 'all_time'.
+    :param folder: Folder of the dataset.
+    :return: A dataframe with one row per (platform, period) the artist is charted in:
+    rank and statistics of the platform(s), sorted by platform and period.
+    """
+
+    condition = (pc.field('entity') == 'Artist') & (pc.field('name') == artist)
+    metrics = [metric for a_platform, platform_columns in platform_metrics.items()
+               if platform in (None, a_platform) for metric in platform_columns]
+
+    if platform is not None:
+        condition &= pc.field('platform') == platform
+
+    history = charts(folder).to_table(columns=['platform', 'period', 'rank'] + metrics,
+                                      filter=condition) \
+        .to_pandas(types_mapper={pa.int64(): pd.Int64Dtype()}.get)
+    history = history.loc[history.period.str.fullmatch(period_patterns[kind])]
+
+    return history.dropna(axis=1, how='all').sort_values(['platform', 'period']) \
+        .reset_index(drop=True)
+
+
+def charts(folder=dataset_folder):
+    """
+    A function to open the dataset (only its file list is read).
+
+    :param folder: Folder of the dataset.
+    :return: A 'pyarrow.dataset.Dataset'.
+    """
+
+    return ds.dataset(folder, format='parquet',
+                      schema=pa.unify_schemas([file_schema, partition_schema]),
+                      partitioning=ds.partitioning(partition_schema, flavor='hive'))
+
+
+def main(argv=None):
+    """
+    A function to query the dataset from the command line.
+
+    :param argv: Arguments (those of the command line by default).
+    """
+
+    parser = argparse.ArgumentParser(description='Query the charts dataset.')
+    parser.add_argument('--folder', default=dataset_folder, help='folder of the dataset')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    chart_parser = commands.add_parser('chart', help='print a single chart')
+    chart_parser.add_argument('platform', choices=list(platform_metrics))
+    chart_parser.add_argument('entity', choices=['Track', 'Artist', 'Label'])
+    chart_parser.add_argument('period', help="e.g. '2021-W21', '2021-06' or "
+                                             "'all_time-2021-W21'")
+    chart_parser.add_argument('--top', type=int, default=None, help='last rank printed')
+
+    history_parser = commands.add_parser('history', help="print an artist's positions")
+    history_parser.add_argument('artist')
+    history_parser.add_argument('--platform', choices=list(platform_metrics))
+    history_parser.add_argument('--kind', choices=list(period_patterns), default='week')
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.command == 'chart':
+        result = read_chart(arguments.platform, arguments.entity, arguments.period,
+                            arguments.top, arguments.folder)
+    else:
+        result = artist_history(arguments.artist, arguments.platform, arguments.kind,
+                                arguments.folder)
+
+    print(result.to_string(index=False))
+
+
+def period_key(period, year, week_number, month_year=None):
+    """
+    A function to name an exported period in the dataset.
+
+    :param period: 'all_time', 'week' or 'month_<n>' (from 'data_collection.export').
+    :param year: ISO year of the week exported.
+    :param week_number: Number of the week exported.
+    :param month_year: Year of the months exported, 'year' by default.
+    :return: The period in the dataset ('2021-W21', '2021-06' or 'all_time-2021-W21').
+    """
+
+    if period == 'week':
+        return f'{year}-W{week_number:02d}'
+
+    if period == 'all_time':
+        return f'all_time-{year}-W{week_number:02d}'
+
+    month_year = year if month_year is None else month_year
+
+    return f'{month_year}-{int(period.split("_")[1]):02d}'
+
+
+def read_chart(platform, entity, period, top=None, folder=dataset_folder):
+    """
+    A function to read a single chart, only its columns and, with 'top', its first row
+    groups.
+
+    :param platform: 'YouTube', '1001Tracklists' or 'Soundcloud'.
+    :param entity: 'Track', 'Artist' or 'Label'.
+    :param period: A period of the dataset (see function 'period_key').
+    :param top: Last rank read, None for the whole chart.
+    :param folder: Folder of the dataset.
+    :return: A dataframe of the chart, in the order of the workbook sheet.
+    """
+
+    columns = ['rank', 'name'] + (['Artist', 'Track_Name', 'Label'] if entity == 'Track'
+                                  else []) + platform_metrics[platform]
+    condition = (pc.field('platform') == platform) & (pc.field('entity') == entity) & \
+        (pc.field('period') == period)
+
+    if top is not None:
+        condition &= pc.field('rank') <= top
+
+    return charts(folder).to_table(columns=columns, filter=condition).to_pandas()
+
+
+def text(column):
+    """
+    A function to convert a column to strings (missing values kept).
+
+    :param column: A series.
+    :return: A series of strings and missing values.
+    """
+
+    return column.astype(object).where(column.notna(), None).map(
+        lambda value: value if value is None else str(value))
+
+
+def write_dataset(exported, year, week_number, folder=dataset_folder, month_year=None):
+    """
+    A function to write the charts of an export in the dataset (replacing those of the
+    same periods).
+
+    :param exported: From function 'data_collection.export' (sheets by period).
+    :param year: ISO year of the week exported.
+    :param week_number: Number of the week exported.
+    :param folder: Folder of the dataset.
+    :param month_year: Year of the months exported, 'year' by default.
+    """
+
+    for period, sheets in exported.items():
+        tables = build_iterators(sheets, period)
+        ranks = ranking.rank_tables(tables)
+        key = period_key(period, year, week_number, month_year)
+
+        for number, table in enumerate(tables):
+            entries = ranks.loc[ranks.table == number]
+            frame = table['df'].assign(name=entries.name.to_numpy(),
+                                       rank=entries['rank'].to_numpy())
+            frame = frame.reindex(columns=file_schema.names)
+
+            for column in text_columns:
+                frame[column] = text(frame[column])
+
+            partition = os.path.join(folder, f'platform={table["plat"]}',
+                                     f'entity={table["entity"]}',
+                                     f'period={key}')
+            buffer = io.BytesIO()
+            pq.write_table(pa.Table.from_pandas(frame, schema=file_schema,
+                                                preserve_index=False),
+                           buffer, row_group_size=rows_per_group)
+
+            os.makedirs(partition, exist_ok=True)
+            write_atomic(os.path.join(partition, 'part-0.parquet'), buffer.getvalue())
+
+
+" - MAIN PART -"
+
+if __name__ == '__main__':
+    main()
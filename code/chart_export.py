@@ -0,0 +1,236 @@
+# -*- coding: utf-8 -*-
+
+import pandas as pd
+
+from aggregation import aggregate, iso_year, period_tables
+from chart_dataset import dataset_folder, write_dataset
+from workbook_writer import workbook_path, write_workbooks
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: chart_export.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Turn the collected statistics into charts: the workbooks of the week, of each
+month and of all time, and the charts dataset. Needs none of the collectors, so charts
+can be exported again without collecting anything.
+
+- Summary -
+
+1. Compute the tables of every period ('aggregation').
+2. Select and sort the nine sheets (3 entities x 3 platforms) of each workbook.
+3. Write the workbooks that changed ('workbook_writer') and the charts dataset
+   ('chart_dataset').
+
+"""
+
+""" - LOCAL FUNCTIONS - """
+
+
+def data_sorted_1001trl(df_track, df_artist, df_label):
+    """
+    A function to select and sort 1001Tracklists.com stats.
+
+    :param df_track: A dataframe of tracks.
+    :param df_artist: A dataframe of artists.
+    :param df_label: A dataframe of labels.
+    :return: Dataframes sorted.
+    """
+
+    df_track = df_track.loc[:, ["Artist",
+                                'Track_Name',
+                                'Label',
+                                '1001T_Supports',
+                                '1001T_TotPlays']].sort_values(['1001T_Supports',
+                                                                '1001T_TotPlays',
+                                                                "Track_Name"],
+                                                               ascending=[False,
+                                                                          False,
+                                                                          True])
+
+    df_artist = df_artist.loc[:, ['1001T_Supports', '1001T_TotPlays']] \
+        .sort_values(['1001T_Supports', '1001T_TotPlays', "Artist"],
+                     ascending=[False, False, True])
+
+    df_label = df_label.loc[:, ['1001T_Supports', '1001T_TotPlays']] \
+        .sort_values(['1001T_Supports', '1001T_TotPlays', "Label"],
+                     ascending=[False, False, True])
+
+    return df_track, df_artist, df_label
+
+
+def data_sorted_sndcld(df_track, df_artist, df_label):
+    """
+    A function to select and sort Soundcloud stats.
+
+    :param df_track: A dataframe of tracks.
+    :param df_artist: A dataframe of artists.
+    :param df_label: A dataframe of labels.
+    :return: Dataframes sorted.
+    """
+
+    df_track = df_track.loc[:, ["Artist", 'Track_Name', 'Label', "Soundcloud_Plays"]] \
+        .sort_values(["Soundcloud_Plays", "Track_Name"], ascending=[False, True])
+
+    df_artist = df_artist.loc[:, ["Soundcloud_Plays"]] \
+        .sort_values(["Soundcloud_Plays", "Artist"], ascending=[False, True])
+
+    df_label = df_label.loc[:, ["Soundcloud_Plays"]].sort_values(
+        ["Soundcloud_Plays", "Label"], ascending=[False, True])
+
+    return df_track, df_artist, df_label
+
+
+def data_sorted_youtube(df_track, df_artist, df_label):
+    """
+    A function to select and sort YouTube stats.
+
+    :param df_track: A dataframe of tracks.
+    :param df_artist: A dataframe of artists.
+    :param df_label: A dataframe of labels.
+    :return: Dataframes sorted.
+    """
+    df_track = df_track.loc[:, ["Artist", 'Track_Name', 'Label', "YouTube_Views"]] \
+        .sort_values(["YouTube_Views", "Track_Name"], ascending=[False, True])
+
+    df_artist = df_artist.loc[:, ["YouTube_Views"]].sort_values(
+        ["YouTube_Views", "Artist"], ascending=[False, True])
+
+    df_label = df_label.loc[:, ["YouTube_Views"]].sort_values(
+        ["YouTube_Views", "Label"], ascending=[False, True])
+
+    return df_track, df_artist, df_label
+
+
+def export_alltime_part(df_by_track, df_by_artist, df_by_label, year):
+    """
+    Part of the function 'export_tables', processing data from 'alltime' dataframes.
+
+    :param df_by_track: All time DF by track.
+    :param df_by_artist: All time DF by artist.
+    :param df_by_label: All time DF by label.
+    :param year: Year of the charts.
+    :return: Destination of the workbook and its sheets.
+    """
+
+    return workbook_path('all_time', year), \
+        workbook_sheets(df_by_track, df_by_artist, df_by_label)
+
+
+def export_monthly_part(df_by_track, df_by_artist, df_by_label, month_number, year):
+    """
+    Part of the function 'export_tables', processing data from monthly dataframes.
+
+    :param df_by_track: Monthly DF by track.
+    :param df_by_artist: Monthly DF by artist.
+    :param df_by_label: Monthly DF by label.
+    :param month_number: Number of the month being analyzed.
+    :param year: Year of the month.
+    :return: Destination of the workbook and its sheets.
+    """
+
+    return workbook_path(f'month_{month_number}', year), \
+        workbook_sheets(df_by_track, df_by_artist, df_by_label)
+
+
+def export_tables(by_track, month_number, week_day_start, week_day_end, week_number,
+                  workbooks=True, charts_folder=dataset_folder):
+    """
+    A function to export the statistics of collected tracks.
+
+    :param by_track: A dataframe of tracks with their statistics (from
+    'data_collection.get_data').
+    :param month_number: Months 1 to 'month_number' of the year of 'week_day_end' are
+    exported.
+    :param week_day_start: First day of the week (its ISO year is that of the charts).
+    :param week_day_end: Last day of the week.
+    :param week_number: Indicates the number of the week to be analyzed.
+    :param workbooks: Whether the workbooks are written.
+    :param charts_folder: Folder of the charts dataset also written (see 'chart_dataset'),
+    None to skip it.
+    :return: The exported sheets, as a dictionary associating period ('all_time', 'week',
+    'month_<n>') and the sheets of its workbook (dictionary associating sheet name and
+    dataframe, laid out as the sheet would be read back from Excel).
+    """
+
+    year, month_year = iso_year(week_day_start), pd.Timestamp(week_day_end).year
+    tables = aggregate(by_track, week_day_start, week_day_end, month_number, month_year)
+
+    jobs = {'all_time': export_alltime_part(*period_tables(tables, 'all_time'), year),
+            'week': export_weekly_part(*period_tables(tables, 'week'), week_number, year)}
+
+    for m__num in range(1, month_number + 1):
+        jobs[f'month_{m__num}'] = export_monthly_part(
+            *period_tables(tables, f'month_{m__num}'), m__num, month_year)
+
+    if workbooks:
+        write_workbooks(list(jobs.values()))
+
+    exported = {period: sheet_frames(sheets) for period, (_, sheets) in jobs.items()}
+
+    if charts_folder is not None:
+        write_dataset(exported, year, week_number, charts_folder, month_year)
+
+    print('Data correctly exported :)')
+
+    return exported
+
+
+def export_weekly_part(df_by_track, df_by_artist, df_by_label, week_number, year):
+    """
+    Part of the function 'export_tables', processing data from weekly dataframes.
+
+    :param df_by_track: Weekly DF by track.
+    :param df_by_artist: Weekly DF by artist.
+    :param df_by_label: Weekly DF by label.
+    :param week_number: Number of the week being analyzed.
+    :param year: Year of the week.
+    :return: Destination of the workbook and its sheets.
+    """
+
+    return workbook_path('week', year, week_number), \
+        workbook_sheets(df_by_track, df_by_artist, df_by_label)
+
+
+def sheet_frames(sheets):
+    """
+    A function to lay out the sheets of a workbook as they would be read from Excel.
+
+    :param sheets: A dictionary associating sheet name and (dataframe, write index).
+    :return: A dictionary associating sheet name and dataframe (index as first column
+    when it is written, default index otherwise).
+    """
+
+    return {sheet_name: frame.reset_index(drop=not index)
+            for sheet_name, (frame, index) in sheets.items()}
+
+
+def workbook_sheets(df_by_track, df_by_artist, df_by_label):
+    """
+    A function to select and sort the nine sheets of an exported workbook.
+
+    :param df_by_track: A dataframe of tracks.
+    :param df_by_artist: A dataframe of artists.
+    :param df_by_label: A dataframe of labels.
+    :return: A dictionary associating sheet name and (dataframe, write index).
+    """
+
+    track_youtube, artist_youtube, label_youtube = \
+        data_sorted_youtube(df_by_track, df_by_artist, df_by_label)
+
+    track_1001trl, artist_1001trl, label_1001trl = \
+        data_sorted_1001trl(df_by_track, df_by_artist, df_by_label)
+
+    track_sndcld, artist_sndcld, label_sndcld = \
+        data_sorted_sndcld(df_by_track, df_by_artist, df_by_label)
+
+    return {'By_Track_YouTube': (track_youtube, False),
+            'By_Track_1001Tracklists': (track_1001trl, False),
+            'By_Track_Soundcloud': (track_sndcld, False),
+            'By_Artist_YouTube': (artist_youtube, True),
+            'By_Artist_1001Tracklists': (artist_1001trl, True),
+            'By_Artist_Soundcloud': (artist_sndcld, True),
+            'By_Label_YouTube': (label_youtube, True),
+            'By_Label_1001Tracklists': (label_1001trl, True),
+            'By_Label_Soundcloud': (label_sndcld, True)}
@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+import threading
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: checkpoint_journal.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Keep every value fetched during a collection on disk as soon as it arrives,
+so a run that dies halfway resumes where it stopped instead of scraping everything again.
+
+- Summary -
+
+1. Each fetched (platform, ID, value) is appended to a SQLite journal (WAL mode), under
+   the name of the run (e.g. the week being collected).
+2. On restart, the collectors load the values already journaled for the run and only
+   fetch the others.
+3. Once the run is complete, its entries are removed.
+
+"""
+
+""" - LOCAL CLASSES - """
+
+
+class CheckpointJournal:
+    """
+    A thread-safe, crash-safe journal of the values fetched during a run.
+    """
+
+    def __init__(self, path, run):
+        """
+        :param path: SQLite file of the journal.
+        :param run: Name of the run (a restarted run must use the same name).
+        """
+
+        self.path = path
+        self.run = str(run)
+        self.lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS entries (run TEXT, '
+                                'platform TEXT, key TEXT, value TEXT, '
+                                'PRIMARY KEY (run, platform, key))')
+        self.connection.commit()
+
+    def close(self):
+        """
+        A method to close the journal (its entries are kept).
+        """
+
+        with self.lock:
+            self.connection.close()
+
+    def done(self, platform):
+        """
+        A method to get the values already journaled for a platform during this run.
+
+        :param platform: Platform name ('youtube', '1001tracklists' or 'soundcloud').
+        :return: A dictionary associating ID and value.
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT key, value FROM entries WHERE run = ? AND platform = ?',
+                (self.run, platform)).fetchall()
+
+        if rows:
+            print(f'Resuming {platform}: {len(rows)} value(s) already fetched')
+
+        return {key: json.loads(value) for key, value in rows}
+
+    def finish(self, platform=None):
+        """
+        A method to remove the entries of the run, once it is complete.
+
+        :param platform: Platform whose entries are removed, None for every platform.
+        """
+
+        with self.lock:
+            if platform is None:
+                self.connection.execute('DELETE FROM entries WHERE run = ?', (self.run,))
+            else:
+                self.connection.execute('DELETE FROM entries WHERE run = ? AND '
+                                        'platform = ?', (self.run, platform))
+            self.connection.commit()
+
+    def record(self, platform, values):
+        """
+        A method to append fetched values to the journal (committed at once).
+
+        :param platform: Platform name.
+        :param values: A dictionary associating ID and value (JSON serializable).
+        """
+
+        if not values:
+            return
+
+        with self.lock:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                [(self.run, platform, str(key), json.dumps(value))
+                 for key, value in values.items()])
+            self.connection.commit()
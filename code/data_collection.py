@@ -1,18 +1,28 @@
 # -*- coding: utf-8 -*-
 
-import re
-from calendar import monthrange
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from time import sleep
+from time import perf_counter
+from urllib.parse import urlparse
 
-import numpy as np
+import httplib2
 import pandas as pd
-import requests
-from bs4 import BeautifulSoup
-from fake_headers import Headers
-from nordvpn_switcher import initialize_VPN, rotate_VPN, terminate_VPN
-
-from Google import Create_Service
+from googleapiclient.errors import HttpError
+
+from aliases import alias, alias_suffixes, find_alias, weak_alias  # noqa: F401
+from chart_dataset import dataset_folder
+from chart_export import export_tables
+from egress_pool import EgressPool, NoEgressLeft
+from extractors import extract_1001tracklists, extract_soundcloud_plays
+from fetch_policy import Deadline, FetchFailed, FetchPolicy, PageGone, RetryableStatus, \
+    check_status, retried_status_codes
+from http_sessions import SessionPool
+from ingestion import load_catalog
+from metrics import run_metrics
+from page_cache import CacheMiss, PageCache
+from rate_limiter import TokenBucket
 
 # import random
 # import shadow_useragent
@@ -51,640 +61,776 @@ https://twitter.com/Dyl_M_DJ/status/1347261399773421570
 
 """ - PREPARATORY ELEMENTS - """
 
-alias = {"PBH & Jack": "PBH & Jack Shizzle", "Daffy Muffin": "Lucas & Steve",
-         "AREA21": ["Martin Garrix", "Maejor"], "Ytram": "Martin Garrix",
-         "Major Lazer": ["Diplo", "Walshy Fire", "Ape Drums"],
-         "Big Pineapple": "Don Diablo", "VIRTUAL SELF": "Porter Robinson",
-         "Streex": "Razihel", "Jack Ü": ["Skrillex", "Diplo"], "NWYR": "W&W",
-         "Axwell Λ Ingrosso": ["Sebastian Ingrosso", "Axwell"], "Bastille": "Dan Smith",
-         "Dan Smith": "Bastille",
-         "Swedish House Mafia": ["Axwell", "Sebastian Ingrosso", "Steve Angello"],
-         "Jeffrey Sutorius": "Dash Berlin", "Shindeai": ["STARRYSKY", "Tai Wuang"],
-         "Sasha": "STARRYSKY", "Casseurs Flowters": ["OrelSan", "Gringe"],
-         "Sinnoh Fusion Ensemble": "insaneintherainmusic",
-         "Destroid": ["Excision", "Far Too Loud"],
-         "Jaxxwell": ["Hardwell", "Blasterjaxx"]}
-
-weak_alias = {"AvB": "Armin van Buuren", "Rising Star": "Armin van Buuren",
-              "NLW": "Afrojack", "GRX": "Martin Garrix", "Jayden Jaxx": "Crime Zcene",
-              "Chill Harris": "Kill Paris", "DJ Afrojack": "Afrojack",
-              "Ravitez": "Chico Rose", "Kerafix & Vultaire": "KEVU",
-              "Lush & Simon": ["Simon Says", "Zen/It"], "Matthew Ros": "MWRS",
-              "Grant Bowtie": "Grant", "M.E.G. & N.E.R.A.K.": "DJ M.E.G.",
-              "MEG / NERAK": "DJ M.E.G.", "Dzeko & Torres": "Dzeko",
-              "X-Teef": "Stemalø", "Juventa": "Jordin Post",
-              "Paris & Simo": "Prince Paris", "The Eden Project": "EDEN",
-              "Astra": "ASHWYN", "Slips & Slurs": "Slippy",
-              "Vorwerk": "Maarten Vorwerk", "Will & Tim": "NewGamePlus",
-              "DBSTF": "D-Block & S-te-Fan", "Maître Gims": "GIMS", "Muzzy": "MUZZ",
-              "Richard Caddock": "Keepsake", "Joey Rumble": "Modern Revolt",
-              "Michelle McKenna": "Michelle Platnum", "Ben Lepper": "Cloud Cage"}
-
 exception_1001T = {''}
 # exception_1001T = {'sub71u5'}
 
-""" - LOCAL FUNCTIONS - """
+tracklists_1001_base_url = 'https://www.1001tracklists.com'
+max_requests_per_host = 8
 
+soundcloud_base_url = 'https://soundcloud.com'
+soundcloud_workers = 8
+soundcloud_rate = 4  # requests per second
+soundcloud_burst = 8
 
-def api_get_videos_views(list_videos_ids, a_service):
-    """
-    A function to get views of 50 videos at once.
+# Columns added by the collector of each platform.
+platform_columns = {'youtube': ['YouTube_Views'],
+                    '1001tracklists': ['1001T_TotPlays', '1001T_Supports'],
+                    'soundcloud': ['Soundcloud_Plays']}
 
-    :param a_service: Access to Google API
-    :param list_videos_ids: A list of video IDs, maximum size 50.
-    :return: a dictionary associating video id and views of said video.
-    """
-
-    views = []
-    chunks50 = [list(sub_list) for sub_list in
-                np.array_split(np.array(list_videos_ids),
-                               len(list_videos_ids) // 50 + 1)]
+# Every column starting with these prefixes holds platform IDs (any number per track).
+youtube_id_prefix = 'YouTube_ID'
+tracklists_1001_id_prefix = '1001Tracklists_ID'
+soundcloud_link_prefix = 'Soundcloud_Link'
 
-    for chunk in chunks50:
-        request = a_service.videos().list(id=",".join(chunk), part='statistics',
-                                          maxResults=50).execute()
-        views += [element['statistics']['viewCount'] for element in request["items"]]
+youtube_api_url = 'https://www.googleapis.com/youtube/v3'
+youtube_fields = 'items(id,statistics/viewCount)'
+youtube_requests_per_batch = 20
 
-    id_and_views = {video_id: {'views': int(views)} for video_id, views in
-                    zip(list_videos_ids, views)}
+page_cache = PageCache('../files/page_cache/', ttl=6 * 3600, max_bytes=500 * 1024 ** 2,
+                       mode='record')
 
-    return id_and_views
+# Kept-alive connections shared by the 1001Tracklists and Soundcloud scrapers.
+session_pool = SessionPool(max_per_host=max(max_requests_per_host, soundcloud_workers))
 
+gone_status_codes = (404, 410)  # The page does not exist (anymore), e.g. deleted track
 
-def clean_html(raw_html):
-    """
-    A function to remove HTML tags.
+# Egresses used at the same time by the scrapers: None is the direct connection, add
+# proxy URLs (e.g. 'http://10.0.0.2:3128') to spread the requests. An egress blocked by a
+# website is retired for it, the VPN is only rotated when all of them are blocked.
+egress_proxies = [None]
+egress_pool = EgressPool(egress_proxies, cooldown=15 * 60)
+max_egress_attempts = 3  # egresses tried for a page before giving up
+vpn_area = ['random countries europe 20']
+vpn_state = {'connected': False}
 
-    :param raw_html: Unprocessed HTML code.
-    :return: Processed HTML code.
-    """
+# Retries with backoff, timeouts and per-host circuit breakers of every collector, and
+# time budget of each collection stage.
+fetch_policy = FetchPolicy(attempts=5, base_delay=0.5, max_delay=30, timeout=30)
+stage_deadline = 3 * 3600  # seconds
+# Socket and HTTP client (e.g. DNS) errors of the batch HTTP calls, worth a retry.
+youtube_errors = (OSError, httplib2.HttpLib2Error)
+youtube_quota_reasons = ('rateLimitExceeded', 'userRateLimitExceeded', 'quotaExceeded')
 
-    cleaner = re.compile('<.*?>')
-    clean_text = re.sub(cleaner, '', str(raw_html))
+refresh_store_path = '../files/refresh_store.json'
+journal_path = '../files/checkpoint_journal.sqlite'
 
-    return clean_text
+""" - LOCAL FUNCTIONS - """
 
 
-def data_by_artist(dataframe):
+def api_get_videos_views(list_videos_ids, a_service, deadline=None, journal=None):
     """
-    A function that groups and sums statistics by artist.
+    A function to get views of videos, 50 IDs per request and several requests per
+    batch HTTP call. Only the ID and view count of each video are requested.
 
-    :param dataframe: A reference dataframe.
-    :return: Result of the grouping.
+    :param a_service: Access to Google API
+    :param list_videos_ids: A list of video IDs (any size).
+    :param deadline: The 'Deadline' of the stage (None for no limit).
+    :param journal: A 'CheckpointJournal' where the views of each answered request are
+    recorded at once, so a crash in the middle of the batches loses none of them.
+    :return: a dictionary associating video id and views of said video, and the list of
+    the IDs YouTube didn't return (deleted or private videos, or missing from the cache
+    in 'replay' mode).
     """
 
-    dataframe.Artist = dataframe.fillna('NONE').Artist.apply(lambda x: x.split(', '))
-    dataframe = dataframe.explode('Artist').groupby('Artist').sum()
+    videos_ids = list(dict.fromkeys(list_videos_ids))
+    chunks50 = [videos_ids[i:i + 50] for i in range(0, len(videos_ids), 50)]
+    responses = {}
+    pending = []
 
-    return dataframe
+    for chunk in chunks50:
+        chunk_link = f'{youtube_api_url}/videos?part=statistics&fields={youtube_fields}' \
+                     f'&id={",".join(chunk)}'
+        content = page_cache.get(chunk_link)
+
+        if content is not None:
+            responses[chunk_link] = json.loads(content)
+        elif page_cache.mode == 'replay':
+            print(f'Not in cache: {chunk_link}')
+        else:
+            pending.append((chunk_link, chunk))
 
+    retried = []
 
-def data_by_label(dataframe):
-    """
-    A function that groups and sums statistics by label.
+    def store_response(request_id, response, exception):
+        if exception is not None:
+            print(f'YouTube request failed ({exception}): {request_id}')
 
-    :param dataframe: A reference dataframe.
-    :return: Result of the grouping.
-    """
+            if isinstance(exception, HttpError) and youtube_retryable(exception):
+                retried.append(request_id)
+        else:
+            content = json.dumps(response).encode('utf-8')
+            responses[request_id] = response
+            page_cache.put(request_id, content)
+            run_metrics.increment('downloaded_bytes_total', len(content),
+                                  host=urlparse(youtube_api_url).netloc)
+
+            if journal is not None:
+                journal.record('youtube', {
+                    element['id']: int(element['statistics']['viewCount'])
+                    for element in response.get('items', [])
+                    if 'viewCount' in element.get('statistics', {})})
+
+    def send_batch(chunks):
+        batch = a_service.new_batch_http_request(callback=store_response)
+        unanswered = [(chunk_link, chunk) for chunk_link, chunk in chunks
+                      if chunk_link not in responses]
+
+        for chunk_link, chunk in unanswered:
+            batch.add(a_service.videos().list(id=",".join(chunk), part='statistics',
+                                              fields=youtube_fields, maxResults=50),
+                      request_id=chunk_link)
+
+        run_metrics.increment('youtube_quota_units_total', len(unanswered))
+        retried.clear()
 
-    dataframe.Label = dataframe.fillna('NONE').Label.apply(lambda x: x.split(', '))
-    dataframe = dataframe.explode('Label').groupby('Label').sum()
-    try:
-        dataframe = dataframe.drop('NONE')
-    except KeyError:
-        pass
+        try:
+            batch.execute()
+        except HttpError as error:
+            if youtube_retryable(error):
+                raise RetryableStatus(f'HTTP {error.resp.status}') from error
+            raise
 
-    return dataframe
+        if retried:  # Only the requests that failed are sent again
+            raise RetryableStatus(f'{len(retried)} request(s) of the batch failed')
 
+    for start in range(0, len(pending), youtube_requests_per_batch):
+        chunks = pending[start:start + youtube_requests_per_batch]
+        started = perf_counter()
 
-def data_sorted_1001trl(df_track, df_artist, df_label):
-    """
-    A function to select and sort 1001Tracklists.com stats.
+        try:
+            fetch_policy.fetch(youtube_api_url, lambda timeout: send_batch(chunks),
+                               deadline, errors=youtube_errors)
+        except FetchFailed as error:
+            print(f'YouTube batch given up ({error})')
 
-    :param df_track: A dataframe of tracks.
-    :param df_artist: A dataframe of artists.
-    :param df_label: A dataframe of labels.
-    :return: Dataframes sorted.
-    """
+        run_metrics.observe('request_seconds', perf_counter() - started,
+                            host=urlparse(youtube_api_url).netloc)
 
-    df_track = df_track.loc[:, ["Artist",
-                                'Track_Name',
-                                'Label',
-                                '1001T_Supports',
-                                '1001T_TotPlays']].sort_values(['1001T_Supports',
-                                                                '1001T_TotPlays',
-                                                                "Track_Name"],
-                                                               ascending=[False,
-                                                                          False,
-                                                                          True])
+    id_and_views = {}
 
-    df_artist = df_artist.loc[:, ['1001T_Supports', '1001T_TotPlays']] \
-        .sort_values(['1001T_Supports', '1001T_TotPlays', "Artist"],
-                     ascending=[False, False, True])
+    for response in responses.values():
+        for element in response.get('items', []):
+            statistics = element.get('statistics', {})
 
-    df_label = df_label.loc[:, ['1001T_Supports', '1001T_TotPlays']] \
-        .sort_values(['1001T_Supports', '1001T_TotPlays', "Label"],
-                     ascending=[False, False, True])
+            if 'viewCount' in statistics:
+                id_and_views[element['id']] = {'views': int(statistics['viewCount'])}
 
-    return df_track, df_artist, df_label
+    missing_ids = [video_id for video_id in videos_ids if video_id not in id_and_views]
 
+    if missing_ids:
+        print(f'{len(missing_ids)} video(s) without views: {", ".join(missing_ids)}')
 
-def data_sorted_sndcld(df_track, df_artist, df_label):
-    """
-    A function to select and sort Soundcloud stats.
+    return id_and_views, missing_ids
 
-    :param df_track: A dataframe of tracks.
-    :param df_artist: A dataframe of artists.
-    :param df_label: A dataframe of labels.
-    :return: Dataframes sorted.
-    """
 
-    df_track = df_track.loc[:, ["Artist", 'Track_Name', 'Label', "Soundcloud_Plays"]] \
-        .sort_values(["Soundcloud_Plays", "Track_Name"], ascending=[False, True])
+def export(data_frame, month_number, week_day_start, week_day_end, week_number,
+           cache_mode=None, refresh_store=None, journal=None,
+           charts_folder=dataset_folder):
+    """
+    A function to collect and export statistics.
 
-    df_artist = df_artist.loc[:, ["Soundcloud_Plays"]] \
-        .sort_values(["Soundcloud_Plays", "Artist"], ascending=[False, True])
+    :param data_frame: From function 'get_data'.
+    :param month_number: From function 'chart_export.export_tables'.
+    :param week_day_start: From function 'chart_export.export_tables'.
+    :param week_day_end: From function 'chart_export.export_tables'.
+    :param week_number: Indicates the number of the week to be analyzed.
+    :param cache_mode: From function 'get_data'.
+    :param refresh_store: From function 'get_data'.
+    :param journal: From function 'get_data'.
+    :param charts_folder: From function 'chart_export.export_tables'.
+    :return: The exported sheets (see function 'chart_export.export_tables').
+    """
 
-    df_label = df_label.loc[:, ["Soundcloud_Plays"]].sort_values(
-        ["Soundcloud_Plays", "Label"], ascending=[False, True])
+    alltime_by_track = get_data(data_frame, cache_mode, refresh_store, journal)
 
-    return df_track, df_artist, df_label
+    return export_tables(alltime_by_track, month_number, week_day_start, week_day_end,
+                         week_number, charts_folder=charts_folder)
 
 
-def data_sorted_youtube(df_track, df_artist, df_label):
+def fan_out(id_index, values, index):
     """
-    A function to select and sort YouTube stats.
+    A function to credit the value of each platform ID to every track using it.
 
-    :param df_track: A dataframe of tracks.
-    :param df_artist: A dataframe of artists.
-    :param df_label: A dataframe of labels.
-    :return: Dataframes sorted.
+    :param id_index: From function 'platform_index'.
+    :param values: A dictionary associating platform ID and value (missing IDs count 0,
+    'pd.NA' for an unknown value, see function 'not_collected').
+    :param index: Index of the tracks.
+    :return: A series ('Int64') with the sum of the values of each track's IDs (0 for none,
+    missing if one of them is unknown).
     """
-    df_track = df_track.loc[:, ["Artist", 'Track_Name', 'Label', "YouTube_Views"]] \
-        .sort_values(["YouTube_Views", "Track_Name"], ascending=[False, True])
-
-    df_artist = df_artist.loc[:, ["YouTube_Views"]].sort_values(
-        ["YouTube_Views", "Artist"], ascending=[False, True])
 
-    df_label = df_label.loc[:, ["YouTube_Views"]].sort_values(
-        ["YouTube_Views", "Label"], ascending=[False, True])
+    platform_ids = id_index.platform_id
+    credited = platform_ids.map(values).where(platform_ids.isin(list(values)), 0) \
+        .astype('Int64')
+    by_track = credited.groupby(id_index.idx.to_numpy())
 
-    return df_track, df_artist, df_label
+    return by_track.sum().mask(credited.isna().groupby(id_index.idx.to_numpy()).any()) \
+        .reindex(index, fill_value=0)
 
 
-def export(data_frame, month_number, week_day_start, week_day_end, week_number):
+def fetch_page(page_link, fetch=None, egress=None, deadline=None):
     """
-    A function to export statistics.
+    A function to download a page, going through the page cache first.
 
-    :param data_frame: From function 'get_data'.
-    :param month_number: From function 'get_data'.
-    :param week_day_start: From function 'get_data'.
-    :param week_day_end: From function 'get_data'.
-    :param week_number: Indicates the number of the week to be analyzed.
-    :return: A complete dataset with needed statistics.
+    :param page_link: URL of the page (also the cache key).
+    :param fetch: A function returning the page content as bytes, by default a GET request
+    on 'page_link'.
+    :param egress: Egress of the default GET request (from 'egress_pool'), None for the
+    direct connection.
+    :param deadline: The 'Deadline' of the stage (None for no limit).
+    :return: The page content (bytes).
+    :raise PageGone: If the page does not exist (anymore).
+    :raise FetchFailed: If the request is given up (see 'fetch_policy'), or answered
+    with another status than 200.
     """
 
-    # print(data_frame)
-
-    weelky_folder = "../weekly_reports/weekly_data/"
-    montly_folder = "../monthly_reports/monthly_data/"
-
-    alltime_by_track = get_data(data_frame)
+    content = page_cache.get(page_link)
 
-    weeek_by_track = alltime_by_track.loc[
-        (alltime_by_track.Release_Date >= week_day_start) & (
-                alltime_by_track.Release_Date <= week_day_end)]
+    if content is not None:
+        return content
 
-    alltime_by_artist = data_by_artist(alltime_by_track)
-    alltime_by_label = data_by_label(alltime_by_track)
+    if page_cache.mode == 'replay':
+        raise CacheMiss(page_link)
 
-    week_by_artist = data_by_artist(weeek_by_track)
-    week_by_label = data_by_label(weeek_by_track)
+    if fetch is None:
+        page_response = fetch_policy.fetch(
+            page_link, lambda timeout: check_status(session_pool.get(
+                page_link, proxies=egress and egress.proxies, timeout=timeout)), deadline)
 
-    alltime_by_track.Artist = alltime_by_track.Artist.apply(', '.join)
-    weeek_by_track.Artist = weeek_by_track.Artist.apply(', '.join)
+        if page_response.status_code in gone_status_codes:
+            run_metrics.increment('gone_pages_total', host=urlparse(page_link).netloc)
+            raise PageGone(f'{page_link}: HTTP {page_response.status_code}')
 
-    alltime_by_track.Label = alltime_by_track.Label.apply(', '.join)
-    weeek_by_track.Label = weeek_by_track.Label.apply(', '.join)
+        if page_response.status_code != 200:
+            raise FetchFailed(f'{page_link}: HTTP {page_response.status_code}')
 
-    export_alltime_part(alltime_by_track, alltime_by_artist, alltime_by_label)
-    export_weekly_part(weeek_by_track, week_by_artist, week_by_label, weelky_folder,
-                       week_number)
+        content = page_response.content
 
-    for m__num in range(1, month_number + 1):
-        month_days = monthrange(2021, m__num)[1]
-        month_day_start = datetime(2021, m__num, 1)
-        month_day_end = datetime(2021, m__num, month_days)
+    else:
+        content = fetch_policy.fetch(page_link, lambda timeout: fetch(), deadline)
 
-        month_by_track = alltime_by_track.loc[
-            (alltime_by_track.Release_Date >= month_day_start) & (
-                    alltime_by_track.Release_Date <= month_day_end)]
+    page_cache.put(page_link, content)
 
-        month_by_artist = data_by_artist(month_by_track)
-        month_by_label = data_by_label(month_by_track)
+    return content
 
-        month_by_track.Artist = month_by_track.Artist.apply(', '.join)
-        month_by_track.Label = month_by_track.Label.apply(', '.join)
-        export_monthly_part(month_by_track, month_by_artist, month_by_label,
-                            montly_folder, m__num)
 
-    return 'Data correctly exported :)'
-
-
-def export_alltime_part(df_by_track, df_by_artist, df_by_label):
+@run_metrics.timed('1001tracklists')
+def get_1001tracklists_data(dataframe, refresh_store=None,
+                            max_per_host=max_requests_per_host,
+                            base_url=tracklists_1001_base_url, journal=None):
     """
-    Part of the function 'export', processing data from 'alltime' dataframes.
+    A function to retrieve data from 1001Tracklists.com
 
-    :param df_by_track: All time DF by track.
-    :param df_by_artist: All time DF by artist.
-    :param df_by_label: All time DF by label.
+    :param dataframe: A reference dataframe (with 1001Tracklists Track ID)
+    :param refresh_store: From function 'get_data'.
+    :param journal: From function 'get_data'.
+    :param max_per_host: Maximum number of simultaneous requests sent to a single host.
+    :param base_url: Root of the 1001Tracklists website (can point to a local stub).
+    :return: A dataframe with number of plays and unique DJ supports.
     """
 
-    alltime_track_youtube, alltime_artist_youtube, alltime_label_youtube = \
-        data_sorted_youtube(df_by_track, df_by_artist, df_by_label)
+    id_index = platform_index(dataframe, tracklists_1001_id_prefix)
+    id_index = id_index.loc[~id_index.platform_id.isin(exception_1001T)]
+    ids_to_fetch, carried = list(id_index.platform_id.unique()), {}
 
-    alltime_track_1001trl, alltime_artist_1001trl, alltime_label_1001trl = \
-        data_sorted_1001trl(df_by_track, df_by_artist, df_by_label)
+    if refresh_store is not None:
+        ids_to_fetch, carried = refresh_store.split(
+            '1001tracklists', ids_to_fetch, platform_release_dates(dataframe, id_index))
 
-    alltime_track_sndcld, alltime_artist_sndcld, alltime_label_sndcld = \
-        data_sorted_sndcld(df_by_track, df_by_artist, df_by_label)
+    resumed = journal.done('1001tracklists') if journal is not None else {}
+    ids_to_fetch = [id_1001tl for id_1001tl in ids_to_fetch if id_1001tl not in resumed]
 
-    writer = pd.ExcelWriter('../files/2021 Charts OUT All Time.xlsx',
-                            engine='xlsxwriter')
+    data_1001tt = asyncio.run(get_1001tracklists_data_async(ids_to_fetch, max_per_host,
+                                                            base_url,
+                                                            Deadline(stage_deadline),
+                                                            journal))
+    data_1001tt.update({id_1001tl: tuple(call) for id_1001tl, call in resumed.items()})
+    blocked = [id_1001tl for id_1001tl, call in data_1001tt.items()
+               if isinstance(call, str)]
 
-    alltime_track_youtube.to_excel(writer, sheet_name='By_Track_YouTube', index=False)
-    alltime_track_1001trl.to_excel(writer, sheet_name='By_Track_1001Tracklists',
-                                   index=False)
-    alltime_track_sndcld.to_excel(writer, sheet_name='By_Track_Soundcloud', index=False)
+    if blocked:
+        print(f'{len(blocked)} tracks not collected (blocked, gone, given up or not in '
+              f'cache): {", ".join(blocked)}')
 
-    alltime_artist_youtube.to_excel(writer, sheet_name='By_Artist_YouTube')
-    alltime_artist_1001trl.to_excel(writer, sheet_name='By_Artist_1001Tracklists')
-    alltime_artist_sndcld.to_excel(writer, sheet_name='By_Artist_Soundcloud')
+    if refresh_store is not None and page_cache.mode != 'replay':
+        refresh_store.record('1001tracklists', {id_1001tl: list(call) for id_1001tl, call
+                                                in data_1001tt.items()
+                                                if not isinstance(call, str)})
 
-    alltime_label_youtube.to_excel(writer, sheet_name='By_Label_YouTube')
-    alltime_label_1001trl.to_excel(writer, sheet_name='By_Label_1001Tracklists')
-    alltime_label_sndcld.to_excel(writer, sheet_name='By_Label_Soundcloud')
+    data_1001tt.update(not_collected('1001tracklists', blocked, refresh_store))
 
-    writer.save()
+    data_1001tt.update({id_1001tl: tuple(value) for id_1001tl, value in carried.items()})
 
+    for position, column in enumerate(["1001T_Supports", "1001T_TotPlays"]):
+        dataframe[column] = fan_out(
+            id_index, {id_1001tl: call[position] if isinstance(call, (list, tuple))
+                       else pd.NA for id_1001tl, call in data_1001tt.items()},
+            dataframe.index)
 
-def export_monthly_part(df_by_track, df_by_artist, df_by_label, folder, month_number):
-    """
-    Part of the function 'export', processing data from monthly dataframes.
+    return dataframe
 
-    :param df_by_track: Monthly DF by track.
-    :param df_by_artist: Monthly DF by artist.
-    :param df_by_label: Monthly DF by label.
-    :param folder: Destination folder for export.
-    :param month_number: Number of the month being analyzed.
+
+async def get_1001tracklists_data_async(ids_1001tl, max_per_host=max_requests_per_host,
+                                        base_url=tracklists_1001_base_url, deadline=None,
+                                        journal=None):
     """
+    A function to retrieve 1001Tracklists.com data for many tracks at once.
 
-    month_track_youtube, month_artist_youtube, month_label_youtube = \
-        data_sorted_youtube(df_by_track, df_by_artist, df_by_label)
+    Requests run concurrently on a pool of 'max_per_host' worker threads of its own (the
+    default executor of asyncio would cap them at min(32, CPUs + 4)), with at most
+    'max_per_host' requests in flight for each host.
 
-    month_track_1001trl, month_artist_1001trl, month_label_1001trl = \
-        data_sorted_1001trl(df_by_track, df_by_artist, df_by_label)
+    :param ids_1001tl: An iterable of unique 1001Tracklists Track IDs.
+    :param max_per_host: Maximum number of simultaneous requests sent to a single host.
+    :param base_url: Root of the 1001Tracklists website (can point to a local stub).
+    :param deadline: The 'Deadline' of the stage (None for no limit).
+    :param journal: A 'CheckpointJournal' where each value is recorded as it arrives.
+    :return: a dictionary associating Track ID and [Unique DJ Supports, Plays] (or the
+    reason it was not collected).
+    """
 
-    month_track_sndcld, month_artist_sndcld, month_label_sndcld = \
-        data_sorted_sndcld(df_by_track, df_by_artist, df_by_label)
+    semaphores = {}
+    loop = asyncio.get_running_loop()
 
-    writer = pd.ExcelWriter(f'{folder}2021 Charts Month {month_number}.xlsx',
-                            engine='xlsxwriter')
+    async def fetch_one(id_1001tl):
+        host = urlparse(base_url).netloc
+        semaphore = semaphores.setdefault(host, asyncio.Semaphore(max_per_host))
 
-    month_track_youtube.to_excel(writer, sheet_name='By_Track_YouTube', index=False)
-    month_track_1001trl.to_excel(writer, sheet_name='By_Track_1001Tracklists',
-                                 index=False)
-    month_track_sndcld.to_excel(writer, sheet_name='By_Track_Soundcloud', index=False)
+        async with semaphore:
+            try:
+                call = await loop.run_in_executor(executor, get_1001tracklists_track_data,
+                                                  id_1001tl, base_url, deadline)
+            except PageGone as error:
+                call = f'GONE - {error}'
+            except FetchFailed as error:
+                call = f'GIVEN UP - {error}'
+            except CacheMiss:
+                call = 'NOT IN CACHE'
 
-    month_artist_youtube.to_excel(writer, sheet_name='By_Artist_YouTube')
-    month_artist_1001trl.to_excel(writer, sheet_name='By_Artist_1001Tracklists')
-    month_artist_sndcld.to_excel(writer, sheet_name='By_Artist_Soundcloud')
+        if journal is not None and not isinstance(call, str):
+            await asyncio.to_thread(journal.record, '1001tracklists', {id_1001tl: call})
 
-    month_label_youtube.to_excel(writer, sheet_name='By_Label_YouTube')
-    month_label_1001trl.to_excel(writer, sheet_name='By_Label_1001Tracklists')
-    month_label_sndcld.to_excel(writer, sheet_name='By_Label_Soundcloud')
+        print(f'{id_1001tl} | {call}')
+        return id_1001tl, call
 
-    writer.save()
+    with ThreadPoolExecutor(max_workers=max_per_host) as executor:
+        results = await asyncio.gather(*(fetch_one(id_1001tl) for id_1001tl in ids_1001tl))
 
+    return dict(results)
 
-def export_weekly_part(df_by_track, df_by_artist, df_by_label, folder, week_number):
-    """
-    Part of the function 'export', processing data from weekly dataframes.
 
-    :param df_by_track: Weekly DF by track.
-    :param df_by_artist: Weekly DF by artist.
-    :param df_by_label: Weekly DF by label.
-    :param folder: Destination folder for export.
-    :param week_number: Number of the week being analyzed.
+def get_1001tracklists_track_data(id_1001tl, base_url=tracklists_1001_base_url,
+                                  deadline=None):
     """
+    A function to retrieve 1001Tracklists.com data with a Track ID.
 
-    week_track_youtube, week_artist_youtube, week_label_youtube = data_sorted_youtube(
-        df_by_track,
-        df_by_artist,
-        df_by_label)
-
-    week_track_1001trl, week_artist_1001trl, week_label_1001trl = data_sorted_1001trl(
-        df_by_track,
-        df_by_artist,
-        df_by_label)
-
-    week_track_sndcld, week_artist_sndcld, week_label_sndcld = data_sorted_sndcld(
-        df_by_track,
-        df_by_artist,
-        df_by_label)
+    :param id_1001tl: 1001Tracklists Track ID.
+    :param base_url: Root of the 1001Tracklists website (can point to a local stub).
+    :param deadline: The 'Deadline' of the stage (None for no limit).
+    :return: a list [Unique DJ Supports, Plays], or the blocking message if every egress
+    tried has been blocked.
+    :raise FetchFailed: If the page could not be downloaded (see 'fetch_policy').
+    """
+    page_link = f'{base_url}/track/{id_1001tl}/'
+    host = urlparse(base_url).netloc
 
-    writer = pd.ExcelWriter(f'{folder}2021 Charts Week {week_number}.xlsx',
-                            engine='xlsxwriter')
+    for _ in range(max_egress_attempts):
 
-    week_track_youtube.to_excel(writer, sheet_name='By_Track_YouTube', index=False)
-    week_track_1001trl.to_excel(writer, sheet_name='By_Track_1001Tracklists',
-                                index=False)
-    week_track_sndcld.to_excel(writer, sheet_name='By_Track_Soundcloud', index=False)
+        try:
+            with egress_pool.use(host) as (egress, generation):
+                data_1001tt = extract_1001tracklists(fetch_page(page_link, egress=egress,
+                                                                deadline=deadline))
 
-    week_artist_youtube.to_excel(writer, sheet_name='By_Artist_YouTube')
-    week_artist_1001trl.to_excel(writer, sheet_name='By_Artist_1001Tracklists')
-    week_artist_sndcld.to_excel(writer, sheet_name='By_Artist_Soundcloud')
+                if data_1001tt is None:
+                    page_cache.discard(page_link)
+                    egress_pool.retire(egress, host, generation)
+                    continue
 
-    week_label_youtube.to_excel(writer, sheet_name='By_Label_YouTube')
-    week_label_1001trl.to_excel(writer, sheet_name='By_Label_1001Tracklists')
-    week_label_sndcld.to_excel(writer, sheet_name='By_Label_Soundcloud')
+        except NoEgressLeft:
+            break
 
-    writer.save()
+        int_supp, int_play = data_1001tt
+        return int_supp, int_play
 
+    return 'IP BLOCKED - Need Rotation'
 
-def find_alias(dataframe):
-    """
-    A function to find alis among artists' names.
 
-    :param dataframe: A reference dataframe.
-    :return: Augmented dataframe with alias.
+def get_data(data_frame, cache_mode=None, refresh_store=None, journal=None,
+             platforms=None):
     """
+    A function to get various data from music on these different platforms:
+        - YouTube
+        - 1001Tracklists # Through 'egress_pool' (VPN as last resort).
+        - Soundcloud # Through 'egress_pool' (VPN as last resort).
 
-    for an_idx, a_row in dataframe.iterrows():
-        artists = a_row.Artist.split(', ')
-        for artist in artists:
-            if artist in weak_alias.keys():
-                if isinstance(weak_alias[artist], list):
-                    for an_alias in weak_alias[artist]:
-                        dataframe.loc[an_idx, 'Artist'] += f', {an_alias}'
-                else:
-                    dataframe.loc[an_idx, 'Artist'] += f', {weak_alias[artist]}'
-            elif artist in alias.keys():
-                if isinstance(alias[artist], list):
-                    for an_alias in alias[artist]:
-                        dataframe.loc[an_idx, 'Artist'] += f', {an_alias}'
-                else:
-                    dataframe.loc[an_idx, 'Artist'] += f', {alias[artist]}'
-    return dataframe
-
-
-def get_1001tracklists_data(dataframe):
-    """
-    A function to retrieve data from 1001Tracklists.com
+        - Spotify #TODO Need Help!
+        - Apple Music #TODO Need Help!
+        - Deezer #TODO Need Help!
+        - Tiktok (?) #TODO Need Help!
 
-    :param dataframe: A reference dataframe (with 1001Tracklists Track ID)
-    :return: A dataframe with number of plays and unique DJ supports.
-    """
+    :param data_frame: A dataframe listing all the information for each track (IDs of
+    the different platforms, labels, artists and release date).
+    :param cache_mode: Mode of the page cache for this run ('off', 'record' or 'replay'),
+    'replay' re-parses the recorded pages without any network call.
+    :param refresh_store: A 'RefreshStore' deciding which IDs are fetched again, the
+    others carrying their last known value (None to fetch everything).
+    :param journal: A 'CheckpointJournal' keeping each value as soon as it is fetched, so
+    a restarted run resumes where it stopped (None to keep them in memory only). Its
+    entries are removed once every platform is collected.
+    :param platforms: Platforms collected ('youtube', '1001tracklists', 'soundcloud'),
+    None for all of them. The columns of the others are not added.
+    :return: A complete dataset with needed statistics. The platforms are collected at
+    the same time; the IDs not collected keep their last known value (missing if there is
+    none, see function 'not_collected'), as do all the IDs of a platform that failed (its
+    journal entries being kept).
+    """
+
+    if cache_mode is not None:
+        page_cache.mode = cache_mode
+
+    if refresh_store is not None and page_cache.mode != 'replay':
+        refresh_store.start_run()
+
+    egress_pool.renew = rotate_vpn if page_cache.mode != 'replay' else None
+
+    collectors = {platform: collector for platform, collector in
+                  {'youtube': get_youtube_data,
+                   '1001tracklists': get_1001tracklists_data,
+                   'soundcloud': get_soundcloud_data}.items()
+                  if platforms is None or platform in platforms}
+    failed = []
+    final = data_frame.copy()
 
-    dataframe["1001T_TotPlays"] = 0
-    dataframe["1001T_Supports"] = 0
+    try:
+        with ThreadPoolExecutor(max_workers=len(collectors)) as executor:
+            futures = {executor.submit(collector, data_frame.copy(), refresh_store,
+                                       journal=journal): platform
+                       for platform, collector in collectors.items()}
 
-    initialize_VPN(save=1, area_input=['random countries europe 20'])
+            for future in as_completed(futures):
+                platform = futures[future]
+                columns = platform_columns[platform]
 
-    for idx, row in dataframe.iterrows():
-        print(f'{idx} | {row["1001Tracklists_ID"]} | {row["Track_Name"]}')
+                try:
+                    final[columns] = future.result()[columns]
 
-        if pd.notna(row['1001Tracklists_ID']) and row['1001Tracklists_ID'] not in exception_1001T:
-            call = get_1001tracklists_track_data(row['1001Tracklists_ID'])
+                except Exception as error:
+                    print(f'{platform} collection failed ({type(error).__name__}: {error}), '
+                          f'its IDs keep their last known value')
+                    final[columns] = last_known_data(data_frame, platform,
+                                                     refresh_store)[columns]
+                    failed.append(platform)
 
-            if isinstance(call, str):
-                print(call)
-                rotate_VPN()
-                data_1001tt = get_1001tracklists_track_data(row['1001Tracklists_ID'])
+    finally:
+        if vpn_state['connected']:
+            from nordvpn_switcher import terminate_VPN
 
-            else:
-                data_1001tt = call
+            terminate_VPN()
+            vpn_state['connected'] = False
 
-            dataframe.loc[idx, "1001T_Supports"], dataframe.loc[idx, "1001T_TotPlays"] = data_1001tt
+    if refresh_store is not None and page_cache.mode != 'replay':
+        refresh_store.save()
 
-    terminate_VPN()
+    if journal is not None and not failed:
+        for platform in collectors:
+            journal.finish(platform)
 
-    return dataframe
+    return final
 
 
-def get_1001tracklists_track_data(id_1001tl):
+@run_metrics.timed('soundcloud')
+def get_soundcloud_data(data_frame, refresh_store=None, workers=soundcloud_workers,
+                        rate=soundcloud_rate, burst=soundcloud_burst,
+                        base_url=soundcloud_base_url, journal=None):
     """
-    A function to retrieve 1001Tracklists.com data with a Track ID.
+    A function to get data from Soundcloud (here, plays for each music).
 
-    :param id_1001tl: 1001Tracklists Track ID.
-    :return: a list [Unique DJ Supports, Plays]
+    :param data_frame: A dataframe with the Soundcloud links associated to each music.
+    :param refresh_store: From function 'get_data'.
+    :param journal: From function 'get_data'.
+    :param workers: Number of tracks scraped at the same time.
+    :param rate: Maximum number of requests per second, shared by all workers.
+    :param burst: Number of requests that can be sent at once before 'rate' applies.
+    :param base_url: Root of the Soundcloud website (can point to a local stub).
+    :return: The same dataframe but with the total number of views for each music.
     """
-    int_supp, int_play = (0, 0)
-    page_link = f'https://www.1001tracklists.com/track/{id_1001tl}/'
-    success = False
 
-    while not success:
+    tracks_plays = {}
+    blocked, gone = [], []
+
+    id_index = platform_index(data_frame, soundcloud_link_prefix)
+    tracks, carried = list(id_index.platform_id.unique()), {}
 
-        try:
-            page_response = requests.get(page_link, headers=Headers().generate())
+    if refresh_store is not None:
+        tracks, carried = refresh_store.split(
+            'soundcloud', tracks, platform_release_dates(data_frame, id_index))
 
-            soup = BeautifulSoup(page_response.content, "html.parser")
+    if journal is not None:
+        resumed = journal.done('soundcloud')
+        tracks = [track_url for track_url in tracks if track_url not in resumed]
+        tracks_plays.update({track_url: {'plays': plays} for track_url, plays
+                             in resumed.items()})
 
-            if 'Your IP has been blocked due to abnormal use.' in soup.text:
-                return 'IP BLOCKED - Need Rotation'
+    bucket = TokenBucket(rate, burst)
+    deadline = Deadline(stage_deadline)
 
-            try:
-                supports = soup.find_all("span",
-                                         class_='badge spR',
-                                         title="total unique DJ supports")[0]
+    def limited_scrapping(track_url):
+        bucket.acquire()
+        return soundcloud_scrapping(track_url, base_url, deadline)
 
-                int_supp = int(clean_html(supports).replace('x', ''))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(limited_scrapping, track_url): track_url
+                   for track_url in tracks}
 
-            except IndexError:
-                int_supp = int(0)
+        for idx, future in enumerate(as_completed(futures)):
+            track_url = futures[future]
+            print(f'{idx} | {track_url}')
 
             try:
-                tot_play = soup.find_all("div",
-                                         class_="c",
-                                         text=re.compile('Total Tracklist Plays:.'))[0]
+                plays = future.result()
+                tracks_plays[track_url] = {'plays': plays}
 
-                int_play = int(clean_html(tot_play)
-                               .replace('x', '')
-                               .replace('Total Tracklist Plays: ', ''))
+                if journal is not None:
+                    journal.record('soundcloud', {track_url: plays})
 
-            except IndexError:
-                int_play = int(1)
+            except PageGone:
+                gone.append(track_url)
 
-            success = True
+            except (ConnectionError, IndexError, NoEgressLeft, FetchFailed):
+                blocked.append(track_url)
 
-        except requests.exceptions.ConnectionError:
-            print("ConnectionError (from \"requests\"): Retrying in 5 sec...")
-            sleep(5)
+            except CacheMiss:
+                print(f'Not in cache: {track_url}')
+                blocked.append(track_url)
 
-    return int_supp, int_play
+    if blocked:
+        print(f'{len(blocked)} tracks not collected (blocked, given up or not in cache): '
+              f'{", ".join(blocked)}')
 
+    if gone:
+        print(f'{len(gone)} tracks not found (deleted?): {", ".join(gone)}')
 
-def get_data(data_frame):
-    """
-    A function to get various data from music on these different platforms:
-        - YouTube
-        - 1001Tracklists # Needs a VPN for now.
-        - Soundcloud # Needs a VPN for now.
+    if refresh_store is not None and page_cache.mode != 'replay':
+        refresh_store.record('soundcloud', {track_url: plays['plays'] for track_url, plays
+                                            in tracks_plays.items()})
 
-        - Spotify #TODO Need Help!
-        - Apple Music #TODO Need Help!
-        - Deezer #TODO Need Help!
-        - Tiktok (?) #TODO Need Help!
+    tracks_plays.update({track_url: {'plays': plays} for track_url, plays
+                         in not_collected('soundcloud', blocked + gone,
+                                          refresh_store).items()})
+    tracks_plays.update({track_url: {'plays': plays} for track_url, plays
+                         in carried.items()})
 
-    :param data_frame: A dataframe listing all the information for each track (IDs of
-    the different platforms, labels, artists and release date).
-    :return: A complete dataset with needed statistics.
-    """
-
-    data1 = get_youtube_data(data_frame)
-    data2 = get_1001tracklists_data(data1)
-    data3 = get_soundcloud_data(data2)
+    return data_frame.assign(Soundcloud_Plays=fan_out(
+        id_index, {track_url: plays['plays'] for track_url, plays in tracks_plays.items()},
+        data_frame.index))
 
-    return data3
 
-
-def get_soundcloud_data(data_frame):
+@run_metrics.timed('youtube')
+def get_youtube_data(data_frame, refresh_store=None, api_endpoint=None, journal=None):
     """
-    A function to get data from Soundcloud (here, plays for each music).
+    A function to get data from YouTube (here, views for each music).
 
-    :param data_frame: A dataframe with the Soundcloud links associated to each music.
+    :param data_frame: A dataframe with the YouTube video IDs associated to each music.
+    :param refresh_store: From function 'get_data'.
+    :param journal: From function 'get_data'.
+    :param api_endpoint: Root URL replacing the YouTube API one (e.g. a local stand-in).
     :return: The same dataframe but with the total number of views for each music.
     """
+    client_secret_file = '../files/code_secret_client.json'
+    api_name = 'YouTube'
+    api_version = 'v3'
+    scopes = ['https://www.googleapis.com/auth/youtube']
 
-    df = data_frame.fillna("NONE")
-    soundcloud_dict = {}
-    tracks_plays = {}
+    if page_cache.mode == 'replay':
+        service = None
+    else:
+        from Google import Create_Service  # Only the YouTube collector needs the API client
 
-    for an_idx, a_row in df.iterrows():
-        soundcloud_dict[a_row["Soundcloud_Link1"]] = [an_idx]
-        soundcloud_dict[a_row["Soundcloud_Link2"]] = [an_idx]
+        service = Create_Service(client_secret_file, api_name, api_version, scopes,
+                                 api_endpoint=api_endpoint)
 
-    df1 = pd.DataFrame(soundcloud_dict).transpose().rename({0: "idx"}, axis=1) \
-        .drop(index="NONE")
+    id_index = platform_index(data_frame, youtube_id_prefix)
+    videos, carried = list(id_index.platform_id.unique()), {}
 
-    tracks = list(df1.index)
+    if refresh_store is not None:
+        videos, carried = refresh_store.split(
+            'youtube', videos, platform_release_dates(data_frame, id_index))
 
-    initialize_VPN(save=1, area_input=['complete rotation'])
+    resumed = journal.done('youtube') if journal is not None else {}
+    videos = [video_id for video_id in videos if video_id not in resumed]
 
-    for idx, track_url in enumerate(tracks):
-        print(f'{idx} | {track_url}')
+    video_views, missing = api_get_videos_views(videos, service, Deadline(stage_deadline),
+                                                journal) if videos else ({}, [])
+    video_views.update({video_id: {'views': views} for video_id, views in resumed.items()})
 
-        try:
-            tracks_plays[track_url] = {'plays': soundcloud_scrapping(track_url)}
+    if refresh_store is not None and page_cache.mode != 'replay':
+        refresh_store.record('youtube', {video_id: views['views'] for video_id, views
+                                         in video_views.items()})
 
-        except (ConnectionError, IndexError):
-            print('IP BLOCKED - Need Rotation')
-            rotate_VPN()
-            tracks_plays[track_url] = {'plays': soundcloud_scrapping(track_url)}
+    video_views.update({video_id: {'views': views} for video_id, views
+                        in not_collected('youtube', missing, refresh_store).items()})
+    video_views.update({video_id: {'views': views} for video_id, views in carried.items()})
 
-        sleep(1)
+    return data_frame.assign(YouTube_Views=fan_out(
+        id_index, {video_id: views['views'] for video_id, views in video_views.items()},
+        data_frame.index))
 
-    terminate_VPN()
 
-    df2 = pd.DataFrame(tracks_plays).transpose().rename({0: "idx", 1: "plays"}, axis=1)
+def last_known_data(data_frame, platform, refresh_store=None):
+    """
+    A function to fill the columns of a platform that could not be collected at all with
+    the last known values of its IDs.
 
-    concat = pd.merge(df1, df2, left_index=True, right_index=True)
-    plays_sum = concat.groupby("idx").sum()
+    :param data_frame: A dataframe with the platform IDs of each track.
+    :param platform: Platform name ('youtube', '1001tracklists' or 'soundcloud').
+    :param refresh_store: From function 'get_data'.
+    :return: A dataframe with the columns of the platform (see function 'fan_out'), missing
+    values for the IDs never fetched.
+    """
 
-    final = data_frame.join(plays_sum, how='outer').rename(
-        {'plays': "Soundcloud_Plays"}, axis=1)
+    prefix = {'youtube': youtube_id_prefix, '1001tracklists': tracklists_1001_id_prefix,
+              'soundcloud': soundcloud_link_prefix}[platform]
+    id_index = platform_index(data_frame, prefix)
 
-    final.Soundcloud_Plays = final.Soundcloud_Plays.fillna(0)
+    if platform == '1001tracklists':
+        id_index = id_index.loc[~id_index.platform_id.isin(exception_1001T)]
+        stored_columns = ["1001T_Supports", "1001T_TotPlays"]  # Order of the stored pairs
+    else:
+        stored_columns = platform_columns[platform]
 
-    return final
+    values = not_collected(platform, id_index.platform_id.unique(), refresh_store)
+
+    return pd.DataFrame({column: fan_out(
+        id_index, {an_id: value[position] if isinstance(value, (list, tuple)) else value
+                   for an_id, value in values.items()}, data_frame.index)
+        for position, column in enumerate(stored_columns)}, index=data_frame.index)
 
 
-def get_youtube_data(data_frame):
+def not_collected(platform, ids, refresh_store=None):
     """
-    A function to get data from YouTube (here, views for each music).
+    A function to give the IDs not collected during this run (blocked, gone or given up)
+    their last known value, instead of a count of 0 that would pass for a real one.
 
-    :param data_frame: A dataframe with the YouTube video IDs associated to each music.
-    :return: The same dataframe but with the total number of views for each music.
+    :param platform: Platform name ('youtube', '1001tracklists' or 'soundcloud').
+    :param ids: An iterable of the platform IDs not collected.
+    :param refresh_store: From function 'get_data'.
+    :return: A dictionary associating each ID and its last value in the refresh store,
+    'pd.NA' if it has none.
     """
-    client_secret_file = '../files/code_secret_client.json'
-    api_name = 'YouTube'
-    api_version = 'v3'
-    scopes = ['https://www.googleapis.com/auth/youtube']
 
-    service = Create_Service(client_secret_file, api_name, api_version, scopes)
+    last_values = refresh_store.last_values(platform, ids) if refresh_store is not None \
+        else {}
+    values = {an_id: last_values.get(an_id, pd.NA) for an_id in ids}
 
-    df = data_frame.fillna("NONE")
-    youtube_dict = {}
+    if last_values:
+        run_metrics.increment('not_collected_total', len(last_values), platform=platform,
+                              kept='last_known')
 
-    for an_idx, a_row in df.iterrows():
-        youtube_dict[a_row["YouTube_ID1"]] = [an_idx]
-        youtube_dict[a_row["YouTube_ID2"]] = [an_idx]
-        youtube_dict[a_row["YouTube_ID3"]] = [an_idx]
-        youtube_dict[a_row["YouTube_ID4"]] = [an_idx]
+    if len(values) > len(last_values):
+        run_metrics.increment('not_collected_total', len(values) - len(last_values),
+                              platform=platform, kept='missing')
 
-    df1 = pd.DataFrame(youtube_dict).transpose().rename({0: "idx"}, axis=1). \
-        drop(index="NONE")
-    videos = list(df1.index)
+    return values
 
-    # print(videos)
 
-    video_views = api_get_videos_views(videos, service)
+def platform_index(data_frame, prefix):
+    """
+    A function to list which tracks use each platform ID.
 
-    df2 = pd.DataFrame(video_views).transpose().rename({0: "idx", 1: "views"}, axis=1)
+    :param data_frame: A dataframe with the platform IDs of each track.
+    :param prefix: Prefix of the columns holding the platform IDs (e.g. 'YouTube_ID' for
+    'YouTube_ID1', 'YouTube_ID2', ...), as many columns as needed.
+    :return: A dataframe with one row per (track, platform ID): 'idx' (index of the track)
+    and 'platform_id'. An ID used by several tracks has one row for each of them.
+    """
 
-    concat = pd.merge(df1, df2, left_index=True, right_index=True)
+    columns = [column for column in data_frame.columns if str(column).startswith(prefix)]
+    melted = data_frame[columns].melt(value_name='platform_id', ignore_index=False) \
+        .platform_id.dropna()
 
-    view_sum = concat.groupby("idx").sum()
+    return melted.rename_axis('idx').reset_index().drop_duplicates()
 
-    # print(data_frame)
-    # print(view_sum)
 
-    final = data_frame.join(view_sum, how='outer').rename({'views': "YouTube_Views"},
-                                                          axis=1)
+def platform_release_dates(data_frame, id_index):
+    """
+    A function to associate each platform ID with the release date of its track.
 
-    final.YouTube_Views = final.YouTube_Views.fillna(0)
+    :param data_frame: A dataframe with the release dates.
+    :param id_index: From function 'platform_index'.
+    :return: A dictionary associating platform ID and release date (the latest one if
+    the ID is used by several tracks).
+    """
 
-    return final
+    release_dates = data_frame.Release_Date.loc[id_index.idx].to_numpy()
 
+    return pd.Series(release_dates).groupby(id_index.platform_id.to_numpy()).max() \
+        .to_dict()
 
-def soundcloud_scrapping(soundcloud_url):
-    """
 
-    :param soundcloud_url:
-    :return:
+def rotate_vpn():
+    """
+    A function to renew 'egress_pool' when every egress is blocked: the VPN is connected
+    the first time, then rotated. Every request waits while the machine reconnects.
     """
-    plays = 0
 
-    page_link = f'https://soundcloud.com/{soundcloud_url}/'
+    from nordvpn_switcher import initialize_VPN, rotate_VPN  # Only needed to rotate
+
+    if not vpn_state['connected']:
+        initialize_VPN(save=1, area_input=vpn_area)
+        vpn_state['connected'] = True
 
-    success = False
-    n_fail = 0
-    while not success:
+    rotate_VPN()
 
-        if n_fail < 3:
 
+def soundcloud_scrapping(soundcloud_url, base_url=soundcloud_base_url, deadline=None):
+    """
+    A function to retrieve the number of plays of a Soundcloud track.
+
+    :param soundcloud_url: Path of the track on Soundcloud ('artist/track-name').
+    :param base_url: Root of the Soundcloud website (can point to a local stub).
+    :param deadline: The 'Deadline' of the stage (None for no limit).
+    :return: Number of plays of the track (IndexError is raised if every egress tried has
+    been blocked, PageGone if the track does not exist anymore, FetchFailed if the page
+    could not be downloaded).
+    """
+    page_link = f'{base_url}/{soundcloud_url}/'
+    host = urlparse(base_url).netloc
+
+    for attempt in range(max_egress_attempts):
+
+        with egress_pool.use(host) as (egress, generation):
             try:
-                page_response = requests.get(page_link, headers=Headers().generate())
-                soup = BeautifulSoup(page_response.content, "html.parser")
-                plays = str(soup.find_all("meta", property="soundcloud:play_count")[0])
-                plays = int(re.search('meta content="(.+?)"', plays).group(1))
-                success = True
+                return extract_soundcloud_plays(fetch_page(page_link, egress=egress,
+                                                           deadline=deadline))
+            except IndexError:
+                page_cache.discard(page_link)
+                egress_pool.retire(egress, host, generation)
 
-            except requests.exceptions.ConnectionError:
-                n_fail += 1
-                print("ConnectionError (from \"requests\"): retrying in 5 sec...")
-                sleep(5)
+                if attempt + 1 == max_egress_attempts:
+                    raise
 
-        else:
-            print('IP SOFT-LOCKED - Need Rotation')
-            rotate_VPN()
 
-    return plays
+def youtube_retryable(error):
+    """
+    A function to tell whether a YouTube API error is worth a retry.
+
+    :param error: A 'googleapiclient.errors.HttpError' (of the batch or of one of its
+    requests).
+    :return: True for too many requests, server errors and exceeded rate limits or quota.
+    """
+
+    status = int(error.resp.status)
+
+    return status in retried_status_codes or \
+        (status == 403 and any(reason in str(error.content) for reason in
+                               youtube_quota_reasons))
 
 
 " - MAIN PROGRAM -"
 
 if __name__ == "__main__":
+    from refresh_policy import RefreshStore
+
     week_sta_str = "2021-01-18"
     week_end_str = "2021-01-24"
 
@@ -694,12 +840,11 @@ if __name__ == "__main__":
     m_num = 1
     w_num = 3
 
-    data_in = find_alias(pd.read_excel("../files/2021 Charts IN.xlsx"))
+    data_in = load_catalog("../files/2021 Charts IN.xlsx")
 
     my_export = export(data_frame=data_in,
                        month_number=m_num,
                        week_day_start=week_sta_str,
                        week_day_end=week_end_str,
-                       week_number=w_num)
-
-    print(my_export)
+                       week_number=w_num,
+                       refresh_store=RefreshStore(refresh_store_path))
@@ -0,0 +1,213 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from contextlib import contextmanager
+from time import monotonic
+
+from metrics import run_metrics
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: egress_pool.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Send the scrapers' requests through several egresses (proxies, or the direct
+connection) at the same time, so an IP block slows the collection down instead of
+stopping it.
+
+- Summary -
+
+1. Each request goes through the healthiest egress, the least busy one on equal health.
+2. The health score of an egress follows its recent successes and failures.
+3. An egress blocked by a host is retired for a while for this host, the other workers
+   keep using the others. A block met before the pool was renewed is ignored.
+4. When every egress is retired, the pool is renewed (e.g. VPN rotation) if it can be,
+   'NoEgressLeft' is raised otherwise.
+
+"""
+
+""" - LOCAL CLASSES - """
+
+
+class NoEgressLeft(RuntimeError):
+    """
+    Raised when every egress of a pool has been retired and the pool cannot be renewed.
+    """
+
+
+class Egress:
+    """
+    A way out to the Internet: a proxy, or the direct connection.
+    """
+
+    def __init__(self, proxy=None):
+        """
+        :param proxy: URL of the proxy (e.g. 'http://10.0.0.2:3128'), None for the direct
+        connection.
+        """
+
+        self.proxy = proxy
+        self.generation = 0  # Incremented each time the pool is renewed
+        self.scores = {}  # Health score by host
+        self.in_use = 0
+        self.retired_until = {}  # End of the retirement by host
+
+    def __repr__(self):
+        return f'Egress({self.proxy or "direct"}, generation={self.generation})'
+
+    @property
+    def proxies(self):
+        """
+        :return: The 'proxies' argument of 'requests' for this egress.
+        """
+
+        if self.proxy is None:
+            return None
+
+        return {'http': self.proxy, 'https': self.proxy}
+
+
+class EgressPool:
+    """
+    A thread-safe pool of egresses with health scores.
+    """
+
+    def __init__(self, proxies=(None,), cooldown=15 * 60, smoothing=0.2, renew=None):
+        """
+        :param proxies: Proxy URLs of the egresses (None for the direct connection).
+        :param cooldown: Number of seconds a blocked egress stays retired.
+        :param smoothing: Weight of the last request in the health score.
+        :param renew: A function called when every egress is retired (e.g. to rotate a
+        VPN), after which they are all used again. None to raise 'NoEgressLeft' instead.
+        """
+
+        if not proxies:
+            raise ValueError('An egress pool needs at least one egress.')
+
+        self.egresses = [Egress(proxy) for proxy in proxies]
+        self.cooldown = cooldown
+        self.smoothing = smoothing
+        self.renew = renew
+        self.renewing = False
+        self.lock = threading.Condition()
+
+    def acquire(self, host=None):
+        """
+        A method to pick the egress of a request.
+
+        :param host: Host requested: an egress blocked by a host is still used for the
+        others.
+        :return: The available egress with the best score for the host, spread by number
+        of requests in flight, and its generation (to give to method 'retire').
+        """
+
+        with self.lock:
+            while True:
+                now = monotonic()
+                available = [egress for egress in self.egresses
+                             if egress.retired_until.get(host, 0.0) <= now]
+
+                if available:
+                    break
+
+                if self.renew is None:
+                    raise NoEgressLeft(f'All {len(self.egresses)} egresses are retired '
+                                       f'for {host}.')
+
+                if self.renewing:  # Another worker is renewing the pool
+                    self.lock.wait()
+                    continue
+
+                self.renew_pool()
+
+            egress = max(available, key=lambda an_egress: an_egress.scores.get(host, 1.0) /
+                         (1 + an_egress.in_use))
+            egress.in_use += 1
+
+            return egress, egress.generation
+
+    def release(self, egress, success=True, host=None, generation=None):
+        """
+        A method to give an egress back after a request.
+
+        :param egress: From method 'acquire'.
+        :param success: Whether the request succeeded (updates the health score).
+        :param host: Host requested.
+        :param generation: Generation of the egress when acquired (None for the current
+        one): the score is not updated by a request sent before a renewal.
+        """
+
+        with self.lock:
+            egress.in_use -= 1
+
+            if generation not in (None, egress.generation) or \
+                    egress.retired_until.get(host, 0.0) > monotonic():
+                return
+
+            score = egress.scores.get(host, 1.0)
+            egress.scores[host] = score + self.smoothing * (float(success) - score)
+
+    def renew_pool(self):
+        """
+        A method to renew the pool (called by method 'acquire', the lock held): 'renew' is
+        called without the lock, the other workers wait for it, then every egress starts a
+        new generation.
+        """
+
+        self.renewing = True
+        self.lock.release()
+
+        try:
+            print('Every egress is blocked, renewing the pool...')
+            self.renew()
+        finally:
+            self.lock.acquire()
+            self.renewing = False
+            self.lock.notify_all()
+
+        run_metrics.increment('rotations_total')
+
+        for egress in self.egresses:
+            egress.generation += 1
+            egress.scores, egress.retired_until = {}, {}
+
+    def retire(self, egress, host=None, generation=None):
+        """
+        A method to stop using an egress blocked by a host, for 'cooldown' seconds.
+
+        :param egress: The blocked egress.
+        :param host: Host which blocked the egress (the egress is still used for the
+        others).
+        :param generation: Generation of the egress when acquired (None for the current
+        one): a block met before a renewal does not retire the renewed egress.
+        """
+
+        with self.lock:
+            if generation not in (None, egress.generation):
+                return
+
+            egress.retired_until[host] = monotonic() + self.cooldown
+            egress.scores[host] = egress.scores.get(host, 1.0) / 2
+
+        run_metrics.increment('blocks_total', egress=egress.proxy or 'direct')
+        print(f'IP BLOCKED - {egress} retired for {self.cooldown} s by {host}')
+
+    @contextmanager
+    def use(self, host=None):
+        """
+        A method to send one request through an egress: the egress is released when the
+        block ends, as a failure if an exception was raised.
+
+        :param host: Host requested (see method 'acquire').
+        :return: The egress and its generation (context manager).
+        """
+
+        egress, generation = self.acquire(host)
+        success = False
+
+        try:
+            yield egress, generation
+            success = True
+        finally:
+            self.release(egress, success, host, generation)
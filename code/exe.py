@@ -1,10 +1,12 @@
 # -*- coding: utf-8 -*-
 
-import data_collection as dc
-import pandas as pd
-import report_writer as rw
+import argparse
+import io
+import os
+from datetime import date, timedelta
 
-from datetime import datetime
+from metrics import run_metrics
+from page_cache import cache_modes, write_atomic
 
 """ - SCRIPT INFORMATION - """
 
@@ -12,30 +14,222 @@ from datetime import datetime
 @file_name: exe.py
 @author: Dylan "dyl-m" Monfret
 
-Do the whole execution process.
+Do the whole execution process, or only some of its stages.
+
+- Summary -
+
+1. 'collect': load the catalog, collect its statistics (every platform, or those given
+   with '--platform') and keep them in 'files/collected/'.
+2. 'aggregate': compute the charts of the collected statistics, in the charts dataset.
+3. 'export': the same, also writing the workbooks.
+4. 'report': write the notes of the week from its workbooks.
+5. 'run' (default): every stage, in a row.
+
+Each stage only imports what it needs: the collectors and their dependencies (requests,
+VPN switcher, Google API client...) are only imported to collect, so exporting or
+reporting again starts at once.
+
+Usage (from the 'code' folder):
+    - python exe.py run --week 21 --year 2021
+    - python exe.py collect --start 2021-05-24 --platform youtube --platform soundcloud
+    - python exe.py collect --week 21 --year 2021 --cache-mode replay
+    - python exe.py export --week 21 --year 2021
+    - python exe.py report --week 21 --year 2021
+
+Without '--start' nor '--week', the last complete week is used. The charts of a week
+belong to its ISO year (2021-W52, 2021-12-27 to 2022-01-02, is in the 2021 charts), its
+months to the calendar year of its last day.
+
 """
 
-week_sta_str = "2021-05-24"
-week_end_str = "2021-05-30"
+""" - PREPARATORY ELEMENTS - """
+
+catalog_path = '../files/2021 Charts IN.xlsx'
+collected_folder = '../files/collected/'
+
+platforms = ['youtube', '1001tracklists', 'soundcloud']
+stages = ['run', 'collect', 'aggregate', 'export', 'report']
+
+""" - LOCAL FUNCTIONS - """
+
+
+def collect(catalog, week_sta_str, week_end_str, some_platforms=None, cache_mode=None):
+    """
+    A function to collect the statistics of the catalog and keep them on disk.
+
+    :param catalog: Path of the catalog (see 'ingestion.load_catalog').
+    :param week_sta_str: First day of the week.
+    :param week_end_str: Last day of the week.
+    :param some_platforms: Platforms collected, None for all of them. The statistics of
+    the others are those of the last collection of the week (missing if there is none).
+    :param cache_mode: Mode of the page cache ('off', 'record' or 'replay'), None to keep
+    its own (see 'data_collection.get_data').
+    :return: A dataframe of tracks with their statistics.
+    """
+
+    import data_collection as dc  # The collectors and their dependencies
+    import pandas as pd
+    from checkpoint_journal import CheckpointJournal
+    from ingestion import load_catalog
+    from refresh_policy import RefreshStore
+
+    data_in = load_catalog(catalog)
+    journal = CheckpointJournal(dc.journal_path, f'{week_sta_str}_{week_end_str}')
+
+    try:
+        by_track = dc.get_data(data_in, cache_mode=cache_mode,
+                               refresh_store=RefreshStore(dc.refresh_store_path),
+                               journal=journal, platforms=some_platforms)
+    finally:
+        journal.close()
+
+    path = collected_path(week_sta_str, week_end_str)
+
+    if some_platforms is not None:
+        previous = load_collected(week_sta_str, week_end_str) if os.path.exists(path) \
+            else None
+
+        for platform in set(platforms) - set(some_platforms):
+            for column in dc.platform_columns[platform]:
+                kept = previous is not None and column in previous.columns and \
+                    previous.index.equals(by_track.index)
+                by_track[column] = previous[column] if kept else \
+                    pd.Series(pd.NA, index=by_track.index, dtype='Int64')
+
+    buffer = io.BytesIO()
+    by_track.to_parquet(buffer)
+
+    os.makedirs(collected_folder, exist_ok=True)
+    write_atomic(path, buffer.getvalue())
+
+    return by_track
+
+
+def collected_path(week_sta_str, week_end_str):
+    """
+    A function to name the file of the statistics collected for a week.
+
+    :param week_sta_str: First day of the week.
+    :param week_end_str: Last day of the week.
+    :return: Path of the file.
+    """
+
+    return f'{collected_folder}{week_sta_str}_{week_end_str}.parquet'
+
+
+def load_collected(week_sta_str, week_end_str):
+    """
+    A function to load the statistics collected for a week.
+
+    :param week_sta_str: First day of the week.
+    :param week_end_str: Last day of the week.
+    :return: A dataframe of tracks with their statistics.
+    """
+
+    import pandas as pd
+
+    path = collected_path(week_sta_str, week_end_str)
+
+    if not os.path.exists(path):
+        raise SystemExit(f"Nothing collected for the week ({path}), run 'collect' first.")
+
+    return pd.read_parquet(path)
+
+
+def main(argv=None):
+    """
+    A function to run the stages asked on the command line.
+
+    :param argv: Arguments (those of the command line by default).
+    """
+
+    parser = argparse.ArgumentParser(description='Weekly charts: collect, aggregate, '
+                                                 'export and report.')
+    parser.add_argument('stage', nargs='?', choices=stages, default='run')
+    parser.add_argument('--start', help='first day (Monday) of the week, YYYY-MM-DD')
+    parser.add_argument('--week', type=int, help='ISO number of the week')
+    parser.add_argument('--year', type=int, help="ISO year of '--week' (current one by "
+                                                 "default)")
+    parser.add_argument('--months', type=int, help='months exported (1 to this one), '
+                                                   'up to the month of the week by default')
+    parser.add_argument('--platform', action='append', choices=platforms,
+                        help="platform collected ('collect' and 'run', every one by "
+                             "default), can be repeated")
+    parser.add_argument('--cache-mode', choices=cache_modes,
+                        help="mode of the page cache ('collect' and 'run'), 'replay' "
+                             "collects again from the recorded pages only")
+    parser.add_argument('--catalog', default=catalog_path, help='input catalog (XLSX, CSV, '
+                                                                'Parquet or SQLite)')
+
+    arguments = parser.parse_args(argv)
+
+    if arguments.start is not None and arguments.week is not None:
+        parser.error("'--start' and '--week' cannot be used together.")
+
+    week_sta_str, week_end_str, w_num = week_dates(arguments.start, arguments.week,
+                                                   arguments.year)
+    m_num = arguments.months or date.fromisoformat(week_end_str).month
+
+    print(f'Week {w_num}: {week_sta_str} to {week_end_str} ({arguments.stage})')
+
+    if arguments.stage == 'collect':
+        collect(arguments.catalog, week_sta_str, week_end_str, arguments.platform,
+                arguments.cache_mode)
+
+    elif arguments.stage in ('aggregate', 'export'):
+        from chart_export import export_tables
+
+        export_tables(load_collected(week_sta_str, week_end_str), m_num, week_sta_str,
+                      week_end_str, w_num, workbooks=arguments.stage == 'export')
+
+    elif arguments.stage == 'report':
+        import report_writer as rw
+        from workbook_writer import workbook_path
+
+        year = date.fromisoformat(week_sta_str).isocalendar()[0]
+        rw.make_report(workbook_path('all_time', year), workbook_path('week', year, w_num),
+                       w_num, year)
+
+    else:
+        import report_writer as rw
+        from chart_export import export_tables
+
+        by_track = collect(arguments.catalog, week_sta_str, week_end_str,
+                           arguments.platform, arguments.cache_mode)
+        my_export = export_tables(by_track, m_num, week_sta_str, week_end_str, w_num)
+        rw.make_report(my_export['all_time'], my_export['week'], w_num,
+                       date.fromisoformat(week_sta_str).isocalendar()[0])
+
+    run_metrics.flush()
+
+
+def week_dates(week_sta_str=None, week_number=None, year=None):
+    """
+    A function to get the days and the number of the week to process.
 
-week_sta_dt = datetime.strptime(week_sta_str, '%Y-%m-%d')
-week_end_dt = datetime.strptime(week_end_str, '%Y-%m-%d')
+    :param week_sta_str: First day of the week (YYYY-MM-DD).
+    :param week_number: ISO number of the week, when its first day is not given.
+    :param year: ISO year of the week (the current one by default).
+    :return: First day, last day (YYYY-MM-DD) and ISO number of the week. Without first day
+    nor number, the last complete week.
+    """
 
-m_num = 6
-w_num = 21
+    if week_sta_str is not None:
+        week_sta_dt = date.fromisoformat(week_sta_str)
+    elif week_number is not None:
+        week_sta_dt = date.fromisocalendar(year or date.today().isocalendar()[0],
+                                           week_number, 1)
+    else:
+        today = date.today()
+        week_sta_dt = today - timedelta(days=today.weekday() + 7)
 
-data_in = dc.find_alias(pd.read_excel("../files/2021 Charts IN.xlsx"))
+    week_end_dt = week_sta_dt + timedelta(days=6)
 
-my_export = dc.export(data_frame=data_in,
-                      month_number=m_num,
-                      week_day_start=week_sta_str,
-                      week_day_end=week_end_str,
-                      week_number=w_num)
+    return week_sta_dt.isoformat(), week_end_dt.isoformat(), week_sta_dt.isocalendar()[1]
 
-print(my_export)
 
-report_source_alltime = pd.ExcelFile('../files/2021 Charts OUT All Time.xlsx')
-report_source_week = pd.ExcelFile(
-    f'../weekly_reports/weekly_data/2021 Charts Week {w_num}.xlsx')
+" - MAIN PART -"
 
-rw.make_report(report_source_alltime, report_source_week, w_num)
+# The guard is needed by the export, which writes the workbooks in separate processes.
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+import re
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: extractors.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Pull the few fields the collectors need straight out of the raw pages,
+without building a whole HTML tree for each of them.
+
+- Summary -
+
+1. Each field is found by a precompiled pattern matching its tag.
+2. The value is read from the tag itself, with the same fallbacks as before
+   (0 DJ supports and 1 play on 1001Tracklists when the field is missing).
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+blocked_1001tracklists = b'Your IP has been blocked due to abnormal use.'
+
+supports_1001tracklists = re.compile(
+    rb'<span(?=[^>]*\sclass=["\']badge spR["\'])'
+    rb'(?=[^>]*\stitle=["\']total unique DJ supports["\'])[^>]*>\s*([\d,]+)\s*x?\s*</span>')
+
+plays_1001tracklists = re.compile(
+    rb'<div(?=[^>]*\sclass=["\']c["\'])[^>]*>'
+    rb'\s*Total Tracklist Plays:\s*([\d,]+)\s*x?\s*</div>')
+
+plays_soundcloud = re.compile(
+    rb'<meta(?=[^>]*\sproperty=["\']soundcloud:play_count["\'])'
+    rb'[^>]*\scontent=["\'](\d+)["\']')
+
+""" - LOCAL FUNCTIONS - """
+
+
+def extract_1001tracklists(content):
+    """
+    A function to read the DJ supports and plays from a 1001Tracklists track page.
+
+    :param content: The raw page (bytes).
+    :return: a list [Unique DJ Supports, Plays], or None if the page tells the IP has
+    been blocked.
+    """
+
+    if blocked_1001tracklists in content:
+        return None
+
+    supports = supports_1001tracklists.search(content)
+    plays = plays_1001tracklists.search(content)
+
+    int_supp = int(supports.group(1).replace(b',', b'')) if supports else 0
+    int_play = int(plays.group(1).replace(b',', b'')) if plays else 1
+
+    return int_supp, int_play
+
+
+def extract_soundcloud_plays(content):
+    """
+    A function to read the number of plays from a Soundcloud track page.
+
+    :param content: The raw page (bytes).
+    :return: Number of plays of the track.
+    :raise IndexError: If the page has no play count (usually a blocked request).
+    """
+
+    plays = plays_soundcloud.search(content)
+
+    if plays is None:
+        raise IndexError('No "soundcloud:play_count" meta tag in the page.')
+
+    return int(plays.group(1))
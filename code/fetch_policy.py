@@ -0,0 +1,300 @@
+# -*- coding: utf-8 -*-
+
+import random
+import threading
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+import requests
+
+from metrics import run_metrics
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: fetch_policy.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Decide, the same way for every collector, when a failed request is retried
+and when to give up, so a single bad host cannot stall a weekly run.
+
+- Summary -
+
+1. A failed request is retried after an exponential delay with jitter ('full jitter'):
+   connection errors, timeouts, truncated responses, and answers telling to come back
+   later (429 and 5xx, see 'check_status').
+2. Each request has a timeout, each stage a deadline: no retry goes past the deadline.
+3. Each host has a circuit breaker: after too many failures in a row, requests to that
+   host fail at once for a while, then a single trial request decides whether it is back.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+retried_errors = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                  requests.exceptions.ChunkedEncodingError,
+                  requests.exceptions.ContentDecodingError)
+
+retried_status_codes = (429, 500, 502, 503, 504)
+
+""" - LOCAL CLASSES - """
+
+
+class FetchFailed(RuntimeError):
+    """
+    Raised when a request is given up (every attempt failed).
+    """
+
+
+class RetryableStatus(requests.exceptions.HTTPError):
+    """
+    Raised by 'check_status' when a host answers it cannot serve the request for now (too
+    many requests, server error).
+    """
+
+
+class CircuitOpen(FetchFailed):
+    """
+    Raised without sending the request when the circuit breaker of its host is open.
+    """
+
+
+class DeadlineExceeded(FetchFailed):
+    """
+    Raised when the deadline of the stage is reached.
+    """
+
+
+class PageGone(FetchFailed):
+    """
+    Raised when the page requested does not exist (anymore), e.g. a deleted track (HTTP
+    404 or 410): it is not retried, and it is not an IP block.
+    """
+
+
+class Deadline:
+    """
+    A time budget, shared by every request of a stage.
+    """
+
+    def __init__(self, seconds=None):
+        """
+        :param seconds: Length of the budget, None for no limit.
+        """
+
+        self.end = None if seconds is None else monotonic() + seconds
+
+    def remaining(self):
+        """
+        :return: Seconds left (None for no limit, never negative).
+        """
+
+        if self.end is None:
+            return None
+
+        return max(0.0, self.end - monotonic())
+
+    def expired(self):
+        """
+        :return: Whether the budget is spent.
+        """
+
+        return self.end is not None and monotonic() >= self.end
+
+
+class CircuitBreaker:
+    """
+    A thread-safe circuit breaker of a host.
+    """
+
+    def __init__(self, threshold=5, reset_after=60):
+        """
+        :param threshold: Number of failures in a row opening the circuit.
+        :param reset_after: Seconds the circuit stays open before a trial request.
+        """
+
+        self.threshold = threshold
+        self.reset_after = reset_after
+        self.failures = 0
+        self.opened_at = None
+        self.trial = False
+        self.lock = threading.Lock()
+
+    def allow(self):
+        """
+        A method to check whether a request may be sent.
+
+        :raise CircuitOpen: If the circuit is open, or if it is half-open and the trial
+        request is already in flight.
+        """
+
+        with self.lock:
+            if self.opened_at is None:
+                return
+
+            if monotonic() - self.opened_at < self.reset_after or self.trial:
+                raise CircuitOpen(f'Circuit open after {self.failures} failures in a row.')
+
+            self.trial = True
+
+    def record(self, success):
+        """
+        A method to record the outcome of a request.
+
+        :param success: Whether the request succeeded, None if the host was not reached.
+        """
+
+        with self.lock:
+            self.trial = False
+
+            if success is None:
+                return
+
+            if success:
+                self.failures, self.opened_at = 0, None
+                return
+
+            self.failures += 1
+
+            if self.failures >= self.threshold:
+                self.opened_at = monotonic()
+
+
+class FetchPolicy:
+    """
+    Retries, timeouts, deadlines and circuit breakers shared by every collector.
+    """
+
+    def __init__(self, attempts=5, base_delay=0.5, max_delay=30, timeout=30,
+                 breaker_threshold=5, breaker_reset=60, errors=retried_errors):
+        """
+        :param attempts: Maximum number of attempts of a request.
+        :param base_delay: Delay before the first retry (at most), in seconds.
+        :param max_delay: Maximum delay between two attempts, in seconds.
+        :param timeout: Timeout of each attempt, in seconds.
+        :param breaker_threshold: Failures in a row opening the circuit of a host.
+        :param breaker_reset: Seconds the circuit of a host stays open.
+        :param errors: Exceptions worth a retry ('RetryableStatus' always is), the others
+        are raised at once.
+        """
+
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.errors = errors
+        self.breakers = {}
+        self.lock = threading.Lock()
+
+    def breaker(self, url):
+        """
+        A method to get the circuit breaker of the host of an URL.
+
+        :param url: An URL.
+        :return: A 'CircuitBreaker' (created on first use).
+        """
+
+        host = urlsplit(url).netloc
+
+        with self.lock:
+            if host not in self.breakers:
+                self.breakers[host] = CircuitBreaker(self.breaker_threshold,
+                                                     self.breaker_reset)
+            return self.breakers[host]
+
+    def delay(self, attempt):
+        """
+        A method to draw the delay before a retry.
+
+        :param attempt: Number of the failed attempt (0 for the first one).
+        :return: A random delay between 0 and the exponential bound, in seconds.
+        """
+
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def fetch(self, url, request, deadline=None, errors=None):
+        """
+        A method to send a request under the policy.
+
+        :param url: URL requested (its host selects the circuit breaker).
+        :param request: A function sending the request, called with the timeout of the
+        attempt (in seconds) and returning its result.
+        :param deadline: The 'Deadline' of the stage, None for no limit.
+        :param errors: Exceptions worth a retry for this request (those of the policy by
+        default, 'RetryableStatus' always is).
+        :return: The result of 'request'.
+        :raise FetchFailed: If the request is given up ('CircuitOpen' and
+        'DeadlineExceeded' being raised before sending anything), or failed with another
+        'requests' error.
+        """
+
+        breaker = self.breaker(url)
+        deadline = deadline or Deadline()
+        errors = (errors or self.errors) + (RetryableStatus,)
+        host = urlsplit(url).netloc
+
+        for attempt in range(self.attempts):
+            if deadline.expired():
+                run_metrics.increment('given_up_total', host=host, reason='deadline')
+                raise DeadlineExceeded(f'Stage deadline reached before fetching {url}')
+
+            try:
+                breaker.allow()
+            except CircuitOpen:
+                run_metrics.increment('given_up_total', host=host, reason='circuit_open')
+                raise
+            remaining = deadline.remaining()
+            timeout = self.timeout if remaining is None else min(self.timeout, remaining)
+
+            try:
+                result = request(timeout)
+
+            except errors as error:
+                breaker.record(False)
+
+                if attempt + 1 == self.attempts:
+                    run_metrics.increment('given_up_total', host=host, reason='attempts')
+                    raise FetchFailed(f'{url}: {error}') from error
+
+                run_metrics.increment('retries_total', host=host)
+
+                wait = self.delay(attempt)
+                print(f'{type(error).__name__} on {url} (attempt {attempt + 1}/'
+                      f'{self.attempts}), retrying in {wait:.1f} sec...')
+                remaining = deadline.remaining()
+                sleep(wait if remaining is None else min(wait, remaining))
+
+            except requests.exceptions.RequestException as error:
+                breaker.record(None)
+                run_metrics.increment('given_up_total', host=host, reason='error')
+                raise FetchFailed(f'{url}: {error}') from error
+
+            except BaseException:
+                breaker.record(None)
+                raise
+
+            else:
+                breaker.record(True)
+                return result
+
+
+""" - LOCAL FUNCTIONS - """
+
+
+def check_status(response):
+    """
+    A function to check the status of a response, inside the request given to
+    'FetchPolicy.fetch', so the answers telling to come back later are retried (and counted
+    by the circuit breaker) instead of being read as pages.
+
+    :param response: A 'requests' response.
+    :return: The same response.
+    :raise RetryableStatus: If its status is one of 'retried_status_codes'.
+    """
+
+    if response.status_code in retried_status_codes:
+        raise RetryableStatus(f'HTTP {response.status_code}', response=response)
+
+    return response
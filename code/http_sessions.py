@@ -0,0 +1,144 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from itertools import cycle
+from time import perf_counter
+from urllib.parse import urlsplit
+
+import requests
+from fake_headers import Headers
+from requests.adapters import HTTPAdapter
+
+from metrics import run_metrics
+
+try:
+    import brotli  # Lets urllib3 decode 'br' answers.
+except ImportError:
+    brotli = None
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: http_sessions.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Share kept-alive HTTP connections between every scraper, instead of opening
+a new connection (TCP + TLS handshake) and generating new headers for each request.
+
+- Summary -
+
+1. Generate a small set of browser header profiles once.
+2. Keep one session per host, its connections being reused by every request to that host.
+3. Send each request with the next header profile, compressed answers being accepted.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+accept_encoding = 'gzip, deflate, br' if brotli else 'gzip, deflate'
+
+""" - LOCAL FUNCTIONS - """
+
+
+def header_profiles(count=8):
+    """
+    A function to generate browser header profiles.
+
+    :param count: Number of profiles.
+    :return: A list of header dictionaries.
+    """
+
+    generator = Headers(headers=True)
+
+    return [{**generator.generate(), 'Accept-Encoding': accept_encoding,
+             'Connection': 'keep-alive'} for _ in range(count)]
+
+
+""" - LOCAL CLASSES - """
+
+
+class SessionPool:
+    """
+    A thread-safe pool of 'requests' sessions, one per host, sharing rotating header
+    profiles.
+    """
+
+    def __init__(self, max_per_host=8, profiles=8, timeout=30):
+        """
+        :param max_per_host: Maximum number of connections kept alive for each host.
+        :param profiles: Number of header profiles to rotate through.
+        :param timeout: Default timeout of a request, in seconds.
+        """
+
+        self.max_per_host = max_per_host
+        self.profile_count = profiles
+        self.timeout = timeout
+        self.profiles = None
+        self.sessions = {}
+        self.lock = threading.Lock()
+
+    def close(self):
+        """
+        A method to close every session (and their connections).
+        """
+
+        with self.lock:
+            for session in self.sessions.values():
+                session.close()
+
+            self.sessions.clear()
+
+    def get(self, url, **kwargs):
+        """
+        A method to send a GET request through the session of the host.
+
+        :param url: URL requested.
+        :param kwargs: Other arguments of 'requests.Session.get'.
+        :return: The response.
+        """
+
+        headers = {**self.next_profile(), **kwargs.pop('headers', {})}
+        kwargs.setdefault('timeout', self.timeout)
+        host = urlsplit(url).netloc
+        start = perf_counter()
+
+        response = self.session(url).get(url, headers=headers, **kwargs)
+
+        run_metrics.observe('request_seconds', perf_counter() - start, host=host)
+        run_metrics.increment('requests_total', host=host)
+        run_metrics.increment('downloaded_bytes_total', len(response.content), host=host)
+
+        return response
+
+    def next_profile(self):
+        """
+        A method to get the next header profile (profiles are generated on first use).
+
+        :return: A header dictionary.
+        """
+
+        with self.lock:
+            if self.profiles is None:
+                self.profiles = cycle(header_profiles(self.profile_count))
+
+            return next(self.profiles)
+
+    def session(self, url):
+        """
+        A method to get the session of the host of an URL, created on first use.
+
+        :param url: An URL.
+        :return: A 'requests.Session'.
+        """
+
+        parts = urlsplit(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+
+        with self.lock:
+            if host not in self.sessions:
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_per_host)
+                session = requests.Session()
+                session.mount(host, adapter)
+                self.sessions[host] = session
+
+            return self.sessions[host]
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import io
+import json
+import os
+import sqlite3
+from contextlib import closing
+
+import pandas as pd
+
+from aliases import alias_suffixes, find_alias
+from metrics import run_metrics
+from page_cache import write_atomic
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: ingestion.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Load the input catalog (XLSX, CSV, Parquet or SQLite) in milliseconds when it
+has not changed since the last run, instead of parsing the workbook again.
+
+- Summary -
+
+1. The catalog is read with the reader of its format and typed (release dates as dates,
+   text columns as strings), then the aliases are expanded ('find_alias').
+2. The result is cached as Parquet, under the hash of the source and of the alias table.
+3. The modification time and size of each source are remembered with its hash: while
+   they are unchanged, the cache is read without even hashing the source again.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+catalog_cache_folder = '../files/catalog_cache/'
+
+sqlite_table = 'catalog'  # Table read from a SQLite source, unless told otherwise
+
+sqlite_extensions = ('.db', '.sqlite', '.sqlite3')
+
+""" - LOCAL FUNCTIONS - """
+
+
+def alias_digest():
+    """
+    A function to hash the alias table, so its changes invalidate the cached catalogs.
+
+    :return: Hexadecimal digest of the alias table.
+    """
+
+    return hashlib.sha256(json.dumps(alias_suffixes, sort_keys=True).encode('utf-8')) \
+        .hexdigest()
+
+
+def file_digest(path):
+    """
+    A function to hash the content of a file.
+
+    :param path: Path of the file.
+    :return: Hexadecimal digest of the file.
+    """
+
+    digest = hashlib.sha256()
+
+    with open(path, 'rb') as a_file:
+        for chunk in iter(lambda: a_file.read(1024 ** 2), b''):
+            digest.update(chunk)
+
+    return digest.hexdigest()
+
+
+@run_metrics.timed('ingestion')
+def load_catalog(path, table=sqlite_table, cache_folder=catalog_cache_folder):
+    """
+    A function to load the input catalog, aliases expanded, from the cache when the source
+    has not changed.
+
+    :param path: Path of the catalog ('.xlsx', '.csv', '.parquet' or a SQLite database).
+    :param table: Table of the catalog in a SQLite database.
+    :param cache_folder: Folder of the cached catalogs.
+    :return: A dataframe of tracks, as 'find_alias(pd.read_excel(path))' would be, with
+    the same types whether it comes from the cache or not.
+    """
+
+    os.makedirs(cache_folder, exist_ok=True)
+
+    sources_path = os.path.join(cache_folder, 'sources.json')
+    source = os.path.abspath(path)
+    stat = os.stat(path)
+
+    try:
+        with open(sources_path, encoding='utf8') as sources_file:
+            sources = json.load(sources_file)
+    except (FileNotFoundError, json.JSONDecodeError):
+        sources = {}
+
+    known = sources.get(source, {})
+
+    if known.get('mtime_ns') == stat.st_mtime_ns and known.get('size') == stat.st_size:
+        digest = known['sha256']
+    else:
+        digest = file_digest(path)
+        sources[source] = {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size,
+                           'sha256': digest}
+        write_atomic(sources_path, json.dumps(sources, indent=1).encode('utf-8'))
+
+    suffix = f'_{table}' if path.lower().endswith(sqlite_extensions) else ''
+    cache_path = os.path.join(cache_folder,
+                              f'{digest[:32]}_{alias_digest()[:16]}{suffix}.parquet')
+
+    if os.path.exists(cache_path):
+        return pd.read_parquet(cache_path)
+
+    data_frame = find_alias(typed_catalog(read_source(path, table)))
+
+    buffer = io.BytesIO()
+    data_frame.to_parquet(buffer, index=False)
+    write_atomic(cache_path, buffer.getvalue())
+
+    return pd.read_parquet(buffer)  # Typed as the cached catalog the next runs will read
+
+
+def read_source(path, table=sqlite_table):
+    """
+    A function to read a catalog with the reader of its format.
+
+    :param path: Path of the catalog ('.xlsx', '.csv', '.parquet' or a SQLite database).
+    :param table: Table of the catalog in a SQLite database.
+    :return: A dataframe of tracks, as stored in the source.
+    """
+
+    extension = os.path.splitext(path)[1].lower()
+
+    if extension in ('.xlsx', '.xls'):
+        return pd.read_excel(path)
+
+    if extension == '.csv':
+        return pd.read_csv(path)
+
+    if extension == '.parquet':
+        return pd.read_parquet(path)
+
+    if extension in sqlite_extensions:
+        with closing(sqlite3.connect(f'file:{path}?mode=ro', uri=True)) as connection:
+            return pd.read_sql(f'SELECT * FROM "{table}"', connection)
+
+    raise ValueError(f"Unknown catalog format '{extension}', expected .xlsx, .csv, "
+                     f".parquet or one of {sqlite_extensions}.")
+
+
+def typed_catalog(data_frame):
+    """
+    A function to give the columns of a catalog the same types whatever its format:
+    release dates as dates, mixed text columns (e.g. track names read as numbers) as
+    strings.
+
+    :param data_frame: A dataframe of tracks, from function 'read_source'.
+    :return: The typed dataframe.
+    """
+
+    data_frame['Release_Date'] = pd.to_datetime(data_frame['Release_Date'])
+
+    for column in data_frame.columns[data_frame.dtypes == object]:
+        data_frame[column] = data_frame[column].where(data_frame[column].isna(),
+                                                      data_frame[column].astype(str))
+
+    return data_frame
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from time import perf_counter
+
+from page_cache import write_atomic
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: metrics.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Measure where the time of a weekly run goes (stages, hosts) and what it
+costs (bytes, retries, blocks, YouTube quota), to catch regressions from one run to
+another.
+
+- Summary -
+
+1. Stages are timed (wall time) and logged as JSON lines as soon as they end.
+2. Requests feed per-host latency histograms and byte counters; retries, blocks,
+   rotations and YouTube quota units are counted.
+3. At the end of the run, a summary is logged and every metric is written as a
+   Prometheus textfile (for the node_exporter textfile collector).
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+metrics_folder = '../files/metrics/'
+
+latency_buckets = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30)  # seconds
+
+metric_help = {
+    'stage_seconds': 'Wall time of the last run of each stage.',
+    'request_seconds': 'Latency of the HTTP requests, by host.',
+    'downloaded_bytes_total': 'Bytes downloaded, by host.',
+    'requests_total': 'HTTP requests sent, by host.',
+    'retries_total': 'Requests retried after a failure, by host.',
+    'given_up_total': 'Requests given up (attempts, deadline or open circuit), by host.',
+    'not_collected_total': 'IDs not collected (blocked, gone or given up), by platform '
+                           'and value kept instead (last known or missing).',
+    'gone_pages_total': 'Pages not found (e.g. deleted tracks), by host.',
+    'blocks_total': 'IP blocks detected, by egress.',
+    'rotations_total': 'VPN rotations (every egress blocked).',
+    'youtube_quota_units_total': 'YouTube Data API quota units spent.'}
+
+""" - LOCAL CLASSES - """
+
+
+class Metrics:
+    """
+    A thread-safe registry of counters, gauges and histograms, with a JSON lines log.
+    """
+
+    def __init__(self, folder=metrics_folder, prefix='charts'):
+        """
+        :param folder: Folder of the JSON lines log ('events.jsonl') and of the Prometheus
+        textfile ('<prefix>.prom').
+        :param prefix: Prefix of the Prometheus metric names.
+        """
+
+        self.folder = folder
+        self.prefix = prefix
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.lock = threading.Lock()
+
+    def flush(self):
+        """
+        A method to log the summary of the run and write the Prometheus textfile.
+        """
+
+        with self.lock:
+            counters = [{'name': name, **dict(labels), 'value': value}
+                        for (name, labels), value in self.counters.items()]
+
+        self.log('summary', counters=counters)
+        write_atomic(os.path.join(self.folder, f'{self.prefix}.prom'),
+                     self.prometheus().encode('utf-8'))
+
+    def increment(self, name, value=1, **labels):
+        """
+        A method to add a value to a counter.
+
+        :param name: Name of the counter (ending with '_total').
+        :param value: Value added.
+        :param labels: Labels of the counter (e.g. host).
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def log(self, event, **fields):
+        """
+        A method to append an event to the JSON lines log.
+
+        :param event: Kind of event ('stage', 'summary', ...).
+        :param fields: Fields of the event.
+        """
+
+        line = json.dumps({'time': datetime.now().isoformat(timespec='seconds'),
+                           'event': event, **fields}, default=str)
+
+        with self.lock:
+            os.makedirs(self.folder, exist_ok=True)
+
+            with open(os.path.join(self.folder, 'events.jsonl'), 'a',
+                      encoding='utf8') as log_file:
+                log_file.write(line + '\n')
+
+    def observe(self, name, value, **labels):
+        """
+        A method to add a value to a histogram ('latency_buckets').
+
+        :param name: Name of the histogram.
+        :param value: Observed value (seconds).
+        :param labels: Labels of the histogram (e.g. host).
+        """
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self.lock:
+            counts, total, count = self.histograms.get(key, ([0] * len(latency_buckets),
+                                                             0.0, 0))
+            counts = [bucket_count + (value <= bound)
+                      for bucket_count, bound in zip(counts, latency_buckets)]
+            self.histograms[key] = (counts, total + value, count + 1)
+
+    def prometheus(self):
+        """
+        A method to format every metric in the Prometheus text format.
+
+        :return: The text of the metrics.
+        """
+
+        def series(name, labels, suffix='', extra=()):
+            pairs = ','.join(f'{key}="{value}"' for key, value in (*labels, *extra))
+            return f'{self.prefix}_{name}{suffix}' + (f'{{{pairs}}}' if pairs else '')
+
+        lines, typed = [], set()
+
+        def header(name, kind):
+            if name not in typed:
+                typed.add(name)
+                lines.append(f'# HELP {self.prefix}_{name} {metric_help.get(name, name)}')
+                lines.append(f'# TYPE {self.prefix}_{name} {kind}')
+
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                header(name, 'counter')
+                lines.append(f'{series(name, labels)} {value}')
+
+            for (name, labels), value in sorted(self.gauges.items()):
+                header(name, 'gauge')
+                lines.append(f'{series(name, labels)} {value:.6f}')
+
+            for (name, labels), (counts, total, count) in sorted(self.histograms.items()):
+                header(name, 'histogram')
+
+                for bound, bucket_count in zip(latency_buckets, counts):
+                    lines.append(f'{series(name, labels, "_bucket", [("le", bound)])} '
+                                 f'{bucket_count}')
+
+                lines.append(f'{series(name, labels, "_bucket", [("le", "+Inf")])} {count}')
+                lines.append(f'{series(name, labels, "_sum")} {total:.6f}')
+                lines.append(f'{series(name, labels, "_count")} {count}')
+
+        return '\n'.join(lines) + '\n'
+
+    @contextmanager
+    def stage(self, name, **labels):
+        """
+        A method to time a stage: its wall time is kept as a gauge and logged at once.
+
+        :param name: Name of the stage (e.g. 'find_alias').
+        :param labels: Other labels of the stage (e.g. workbook).
+        """
+
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.stage_done(name, perf_counter() - start, **labels)
+
+    def stage_done(self, name, seconds, **labels):
+        """
+        A method to record the wall time of a stage timed elsewhere (e.g. in another
+        process).
+
+        :param name: Name of the stage.
+        :param seconds: Wall time of the stage.
+        :param labels: Other labels of the stage.
+        """
+
+        with self.lock:
+            self.gauges['stage_seconds', tuple(sorted({'stage': name,
+                                                       **labels}.items()))] = seconds
+
+        self.log('stage', stage=name, seconds=round(seconds, 6), **labels)
+
+    def timed(self, name):
+        """
+        A method to time every call of a function as a stage (decorator).
+
+        :param name: Name of the stage.
+        :return: The decorator.
+        """
+
+        def decorator(function):
+            @wraps(function)
+            def timed_function(*args, **kwargs):
+                with self.stage(name):
+                    return function(*args, **kwargs)
+
+            return timed_function
+
+        return decorator
+
+
+# Metrics of the run, shared by every module.
+run_metrics = Metrics()
@@ -0,0 +1,226 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from time import time
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: page_cache.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Keep the raw pages downloaded by the collectors on disk, so a crashed or
+repeated run doesn't download them again, and so a whole run can be replayed offline.
+
+- Summary -
+
+1. Page bodies are stored once under the hash of their content ('objects' folder).
+2. Each URL points to a body and remembers when it was fetched ('index' folder).
+3. Entries older than the TTL are ignored, the oldest ones are evicted when the cache
+   grows over its size limit.
+
+Modes:
+    - 'off': the cache is neither read nor written.
+    - 'record': fresh pages are read from the cache, the others are fetched and stored.
+    - 'replay': pages are only read from the cache (whatever their age), a missing page
+      raises 'CacheMiss' instead of reaching the network.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+cache_modes = ('off', 'record', 'replay')
+
+""" - LOCAL CLASSES - """
+
+
+class CacheMiss(KeyError):
+    """
+    Raised in 'replay' mode when a page has never been recorded.
+    """
+
+
+class PageCache:
+    """
+    A content-addressed on-disk cache of raw responses, keyed by URL.
+    """
+
+    def __init__(self, folder, ttl=6 * 3600, max_bytes=500 * 1024 ** 2, mode='record'):
+        """
+        :param folder: Folder where the cache is stored.
+        :param ttl: Number of seconds a page stays fresh.
+        :param max_bytes: Maximum size of the stored page bodies.
+        :param mode: 'off', 'record' or 'replay'.
+        """
+
+        self.folder = folder
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.size = None
+        self.lock = threading.Lock()
+
+    @property
+    def mode(self):
+        return self._mode
+
+    @mode.setter
+    def mode(self, value):
+        if value not in cache_modes:
+            raise ValueError(f"Unknown cache mode '{value}', "
+                             f"expected one of {cache_modes}.")
+        self._mode = value
+
+    def _entry_path(self, url):
+        return os.path.join(self.folder, 'index',
+                            f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.folder, 'objects', digest[:2], digest)
+
+    def _read_entry(self, entry_path):
+        try:
+            with open(entry_path, encoding='utf8') as entry_file:
+                return json.load(entry_file)
+        except (OSError, ValueError):
+            return None
+
+    def discard(self, url):
+        """
+        A method to forget a URL (e.g. a page that turned out to be an error page).
+
+        :param url: URL of the page.
+        """
+
+        try:
+            os.remove(self._entry_path(url))
+        except FileNotFoundError:
+            pass
+
+    def evict(self):
+        """
+        A method to drop expired entries, then the oldest ones until the cache fits in
+        'max_bytes', and finally the page bodies no longer referenced. A body shared by
+        several entries only counts (and goes) once the last of them is dropped.
+        """
+
+        index_folder = os.path.join(self.folder, 'index')
+        objects_folder = os.path.join(self.folder, 'objects')
+
+        if not os.path.isdir(index_folder):
+            return
+
+        with self.lock:
+            entries = []
+
+            for name in os.listdir(index_folder):
+                entry_path = os.path.join(index_folder, name)
+                entry = self._read_entry(entry_path)
+
+                if entry is None or time() - entry['fetched_at'] > self.ttl:
+                    os.remove(entry_path)
+                else:
+                    entries.append((entry['fetched_at'], entry_path, entry))
+
+            references = Counter(self._object_path(entry[2]['object']) for entry in entries)
+            sizes = {object_path: os.path.getsize(object_path) for object_path in references
+                     if os.path.exists(object_path)}
+            total = sum(sizes.values())
+
+            for _, entry_path, entry in sorted(entries, key=lambda e: e[0]):
+                if total <= self.max_bytes:
+                    break
+
+                os.remove(entry_path)
+                object_path = self._object_path(entry['object'])
+                references[object_path] -= 1
+
+                if references[object_path] == 0:
+                    total -= sizes.pop(object_path, 0)
+
+            for root, _, files in os.walk(objects_folder):
+                for name in files:
+                    object_path = os.path.join(root, name)
+                    if object_path not in sizes:
+                        os.remove(object_path)
+
+            self.size = total
+
+    def get(self, url):
+        """
+        A method to read a page from the cache.
+
+        :param url: URL of the page.
+        :return: The page body (bytes), or None if it is missing or no longer fresh.
+        """
+
+        if self.mode == 'off':
+            return None
+
+        entry = self._read_entry(self._entry_path(url))
+
+        if entry is None:
+            return None
+
+        if self.mode == 'record' and time() - entry['fetched_at'] > self.ttl:
+            return None
+
+        try:
+            with open(self._object_path(entry['object']), 'rb') as object_file:
+                return object_file.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, url, content):
+        """
+        A method to store a page in the cache (only in 'record' mode).
+
+        :param url: URL of the page.
+        :param content: The page body (bytes).
+        """
+
+        if self.mode != 'record':
+            return
+
+        digest = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(digest)
+        entry_path = self._entry_path(url)
+
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        os.makedirs(os.path.dirname(entry_path), exist_ok=True)
+
+        with self.lock:
+            if not os.path.exists(object_path):
+                write_atomic(object_path, content)
+
+                if self.size is not None:
+                    self.size += len(content)
+
+            write_atomic(entry_path, json.dumps({'url': url, 'object': digest,
+                                                 'fetched_at': time()}).encode('utf-8'))
+
+        if self.size is None or self.size > self.max_bytes:
+            self.evict()
+
+
+""" - LOCAL FUNCTIONS - """
+
+
+def write_atomic(path, content):
+    """
+    A function to write a file without leaving it half-written if the run crashes.
+
+    :param path: Destination of the file.
+    :param content: Bytes to write.
+    """
+
+    temp_path = f'{path}.{threading.get_ident()}.tmp'
+
+    with open(temp_path, 'wb') as temp_file:
+        temp_file.write(content)
+
+    os.replace(temp_path, path)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+import os
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: ranking.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Give chart positions to every entry of the report tables, compare them with
+the previous week and keep them for the next one.
+
+- Summary -
+
+1. Stack every table (period x entity x platform) in one long table.
+2. Compute dense ranks (ties share a position) for all tables at once.
+3. Join the ranks of the previous week to get the movement of each entry.
+4. Keep the ranks of each week in a file named after its ISO year and number.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+ranks_folder = '../weekly_reports/weekly_ranks/'
+
+rank_keys = ['period', 'entity', 'platform', 'name']
+
+""" - LOCAL FUNCTIONS - """
+
+
+def add_movement(ranks, previous):
+    """
+    A function to compare ranks with those of the previous week.
+
+    :param ranks: From function 'rank_tables'.
+    :param previous: Ranks of the previous week (from function 'load_ranks'), or None.
+    :return: The ranks with a 'move' column: '▲n' / '▼n' (up / down n positions), '='
+    (no change), 'NEW' (not ranked last week) or '' (no previous week to compare with).
+    """
+
+    if previous is None:
+        return ranks.assign(move='')
+
+    previous = previous.drop_duplicates(rank_keys)[rank_keys + ['rank']] \
+        .rename(columns={'rank': 'previous_rank'})
+    merged = ranks.merge(previous, how='left', on=rank_keys)
+    merged.index = ranks.index
+
+    move = merged.previous_rank - merged['rank']
+    steps = move.abs().fillna(0).astype(int).astype(str)
+
+    return ranks.assign(move=np.select([merged.previous_rank.isna(), move > 0, move < 0],
+                                       ['NEW', '▲' + steps, '▼' + steps], default='='))
+
+
+def entry_names(data_frame, entity):
+    """
+    A function to name the entries of a table, the same way from one week to another.
+
+    :param data_frame: A report table.
+    :param entity: 'Track', 'Artist' or 'Label'.
+    :return: A series of names ('Artist - Track_Name' for tracks).
+    """
+
+    if entity == 'Track':
+        return data_frame['Artist'].astype(str) + ' - ' + data_frame['Track_Name'].astype(str)
+
+    return data_frame[entity].astype(str)
+
+
+def load_ranks(year, week_num, folder=ranks_folder):
+    """
+    A function to load the ranks saved for a week.
+
+    :param year: ISO year of the week.
+    :param week_num: ISO number of the week.
+    :param folder: Folder of the saved ranks.
+    :return: A dataframe of ranks, or None if the week has not been ranked.
+    """
+
+    path = ranks_path(year, week_num, folder)
+
+    if not os.path.exists(path):
+        return None
+
+    return pd.read_csv(path, dtype={'name': str}, keep_default_na=False)
+
+
+def previous_week(year, week_num):
+    """
+    A function to get the week before another one (e.g. 2020-W53 before 2021-W01).
+
+    :param year: ISO year of the week.
+    :param week_num: ISO number of the week.
+    :return: ISO year and number of the previous week.
+    """
+
+    previous_monday = date.fromisocalendar(year, week_num, 1) - timedelta(days=7)
+
+    return previous_monday.isocalendar()[0], previous_monday.isocalendar()[1]
+
+
+def rank_tables(tables):
+    """
+    A function to rank the entries of every table in one vectorized pass.
+
+    :param tables: A list of dictionaries with keys 'df' (table sorted by statistics),
+    'stat' (one or two statistics, by order of priority), 'period', 'entity' and 'plat'.
+    :return: A dataframe with one row per entry: 'table' (position in the list), 'row'
+    (position in the table), 'period', 'entity', 'platform', 'name' and 'rank' (dense rank,
+    1 being the best, missing statistics ranked last).
+    """
+
+    frames = []
+
+    for number, table in enumerate(tables):
+        data_frame, stats = table['df'], table['stat']
+
+        frames.append(pd.DataFrame({
+            'table': number,
+            'row': np.arange(len(data_frame)),
+            'period': table['period'],
+            'entity': table['entity'],
+            'platform': table['plat'],
+            'name': entry_names(data_frame, table['entity']).to_numpy(),
+            'primary': data_frame[stats[0]].to_numpy('int64', na_value=-1),
+            'secondary': data_frame[stats[1]].to_numpy('int64', na_value=-1)
+            if len(stats) > 1 else 0}))
+
+    ranks = pd.concat(frames, ignore_index=True) \
+        .sort_values(['table', 'primary', 'secondary'], ascending=[True, False, False],
+                     kind='stable')
+
+    new_value = (ranks.table.diff() != 0) | (ranks.primary.diff() != 0) | \
+        (ranks.secondary.diff() != 0)
+    ranks['rank'] = new_value.astype(int).groupby(ranks.table).cumsum()
+
+    return ranks.sort_index().drop(columns=['primary', 'secondary'])
+
+
+def ranks_path(year, week_num, folder=ranks_folder):
+    """
+    A function to name the file of the ranks of a week.
+
+    :param year: ISO year of the week.
+    :param week_num: ISO number of the week.
+    :param folder: Folder of the saved ranks.
+    :return: Path of the file ('2021-W21_Ranks.csv').
+    """
+
+    return os.path.join(folder, f'{year}-W{week_num:02d}_Ranks.csv')
+
+
+def save_ranks(ranks, year, week_num, folder=ranks_folder):
+    """
+    A function to save the ranks of a week, to be compared with the next one.
+
+    :param ranks: From function 'rank_tables'.
+    :param year: ISO year of the week.
+    :param week_num: ISO number of the week.
+    :param folder: Folder of the saved ranks.
+    """
+
+    os.makedirs(folder, exist_ok=True)
+    ranks[rank_keys + ['rank']].to_csv(ranks_path(year, week_num, folder), index=False)
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+import threading
+from time import monotonic, sleep
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: rate_limiter.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Limit the pace of the requests sent to a website while letting several
+workers share that budget.
+
+- Summary -
+
+1. A bucket holds up to 'burst' tokens and refills at 'rate' tokens per second.
+2. Each request takes one token, waiting for the refill when the bucket is empty.
+
+"""
+
+""" - LOCAL CLASSES - """
+
+
+class TokenBucket:
+    """
+    A thread-safe token bucket (requests per second plus burst).
+    """
+
+    def __init__(self, rate, burst=1):
+        """
+        :param rate: Number of tokens added to the bucket each second.
+        :param burst: Maximum number of tokens the bucket can hold.
+        """
+
+        if rate <= 0 or burst < 1:
+            raise ValueError("'rate' must be positive and 'burst' at least 1.")
+
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.last_refill = monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self, tokens=1):
+        """
+        A method to take tokens from the bucket, blocking until they are available.
+
+        :param tokens: Number of tokens needed (one per request).
+        :return: Time spent waiting, in seconds.
+        """
+
+        if tokens > self.burst:
+            raise ValueError("Cannot acquire more tokens than the bucket can hold.")
+
+        waited = 0.0
+
+        while True:
+            with self.lock:
+                now = monotonic()
+                refill = (now - self.last_refill) * self.rate
+                self.tokens = min(self.burst, self.tokens + refill)
+                self.last_refill = now
+
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return waited
+
+                wait = (tokens - self.tokens) / self.rate
+
+            sleep(wait)
+            waited += wait
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import zlib
+from datetime import datetime, timedelta
+
+import pandas as pd
+
+from page_cache import write_atomic
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: refresh_policy.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Avoid re-fetching, every week, numbers that barely move. The last value
+fetched for each platform ID is kept on disk, and only the IDs that need it are
+fetched again; the others carry their last known value forward.
+
+- Summary -
+
+1. Recent releases that still gain audience are refreshed at every run.
+2. Older or low-velocity IDs are refreshed every 'stale_every' runs, each one in its own
+   phase (from a stable hash of the ID), so the catalog is refreshed a slice per run
+   instead of all at once.
+3. IDs never fetched before are always fetched.
+
+"""
+
+""" - LOCAL CLASSES - """
+
+
+class RefreshStore:
+    """
+    A persistent per-ID store of the last fetched values, with the refresh policy.
+    """
+
+    def __init__(self, path, recent_days=28, stale_every=4, min_velocity=0.005):
+        """
+        :param path: JSON file where the store is saved.
+        :param recent_days: A track released less than 'recent_days' ago is recent.
+        :param stale_every: Number of runs between two fetches of an older or
+        low-velocity ID.
+        :param min_velocity: Relative growth per run under which an ID is low-velocity.
+        """
+
+        self.path = path
+        self.recent_days = recent_days
+        self.stale_every = stale_every
+        self.min_velocity = min_velocity
+        self.run = 0
+        self.items = {}
+
+        if os.path.exists(path):
+            with open(path, encoding='utf8') as store_file:
+                stored = json.load(store_file)
+
+            self.run = stored['run']
+            self.items = stored['items']
+
+    def is_due(self, platform, an_id, release_date, reference_date):
+        """
+        A method to tell whether an ID must be fetched during this run.
+
+        :param platform: Platform name ('youtube', '1001tracklists' or 'soundcloud').
+        :param an_id: Platform ID of the track.
+        :param release_date: Release date of the track (None if unknown).
+        :param reference_date: Date of the run.
+        :return: True if the ID must be fetched.
+        """
+
+        item = self.items.get(platform, {}).get(an_id)
+
+        if item is None:
+            return True
+
+        recent = release_date is not None and pd.notna(release_date) and \
+            reference_date - pd.Timestamp(release_date) <= timedelta(days=self.recent_days)
+        velocity = item.get('velocity')
+        low_velocity = velocity is not None and velocity < self.min_velocity
+
+        if recent and not low_velocity:
+            return True
+
+        return (self.run + phase(platform, an_id)) % self.stale_every == 0
+
+    def last_values(self, platform, ids):
+        """
+        A method to get the last fetched values of some IDs.
+
+        :param platform: Platform name.
+        :param ids: An iterable of platform IDs.
+        :return: A dictionary associating each ID already fetched once and its last value.
+        """
+
+        items = self.items.get(platform, {})
+
+        return {an_id: items[an_id]['value'] for an_id in ids if an_id in items}
+
+    def record(self, platform, values):
+        """
+        A method to store freshly fetched values.
+
+        :param platform: Platform name.
+        :param values: A dictionary associating platform ID and fetched value.
+        """
+
+        items = self.items.setdefault(platform, {})
+
+        for an_id, value in values.items():
+            previous = items.get(an_id)
+            velocity = None
+
+            if previous is not None and self.run > previous['run']:
+                before, after = magnitude(previous['value']), magnitude(value)
+                velocity = (after - before) / max(before, 1) / (self.run - previous['run'])
+
+            items[an_id] = {'value': value, 'run': self.run, 'velocity': velocity,
+                            'fetched_at': datetime.now().isoformat(timespec='seconds')}
+
+    def save(self):
+        """
+        A method to write the store on disk.
+        """
+
+        folder = os.path.dirname(self.path)
+
+        if folder:
+            os.makedirs(folder, exist_ok=True)
+
+        write_atomic(self.path, json.dumps({'run': self.run, 'items': self.items})
+                     .encode('utf-8'))
+
+    def split(self, platform, ids, release_dates=None, reference_date=None):
+        """
+        A method to separate the IDs to fetch from the IDs carried forward.
+
+        :param platform: Platform name.
+        :param ids: An iterable of platform IDs.
+        :param release_dates: A dictionary associating platform ID and release date.
+        :param reference_date: Date of the run (now by default).
+        :return: The list of IDs to fetch, and a dictionary associating each other ID
+        and its last known value.
+        """
+
+        release_dates = release_dates or {}
+        reference_date = pd.Timestamp(reference_date or datetime.now())
+        due, carried = [], {}
+
+        for an_id in ids:
+            if self.is_due(platform, an_id, release_dates.get(an_id), reference_date):
+                due.append(an_id)
+            else:
+                carried[an_id] = self.items[platform][an_id]['value']
+
+        print(f'{platform}: {len(due)} ID(s) to fetch, {len(carried)} carried forward')
+
+        return due, carried
+
+    def start_run(self):
+        """
+        A method to count a new run (call once per run, before any 'split').
+        """
+
+        self.run += 1
+
+
+""" - LOCAL FUNCTIONS - """
+
+
+def magnitude(value):
+    """
+    A function to reduce a stored value to one number (sum of its parts if it is a list,
+    e.g. 1001Tracklists supports and plays).
+
+    :param value: A stored value.
+    :return: A number.
+    """
+
+    if isinstance(value, (list, tuple)):
+        return sum(value)
+
+    return value
+
+
+def phase(platform, an_id):
+    """
+    A function to spread the refresh of the older IDs over the runs.
+
+    :param platform: Platform name.
+    :param an_id: Platform ID of the track.
+    :return: A stable number for the ID (the same from a run to another).
+    """
+
+    return zlib.crc32(f'{platform}:{an_id}'.encode('utf-8'))
@@ -2,6 +2,17 @@
 
 import pandas as pd
 
+import ranking
+from metrics import run_metrics
+
+try:
+    import python_calamine  # noqa: F401 (only needed by pandas' 'calamine' engine)
+
+    excel_engine = 'calamine'
+
+except ImportError:
+    excel_engine = 'openpyxl'
+
 """
 @file_name: report_writer.py
 @author: Dylan "dyl-m" Monfret
@@ -10,8 +21,8 @@ Objective: Automatically write report notes for future posts on Twitter.
 
 - Summary -
 
-1. Retrieve information from Excel files
-2. Iterate on it to get the TOP 3.
+1. Retrieve information from the export (or from Excel files)
+2. Rank every table and compare with the previous week to get the TOP 3.
 3. Write the results in .txt format.
 
 """
@@ -27,13 +38,14 @@ def build_list_we(lst1, lst2):
     return return_lst
 
 
-def write_report(a_list):
+def write_report(a_list, ranks, top_n=3):
     string = ""
     cpt = 0
     idx_df = 0
     lab_df = ["TRACKS", "ARTISTS", "LABELS"]
+    charted = ranks.loc[ranks['rank'] <= top_n]
 
-    for df in a_list:
+    for number, df in enumerate(a_list):
 
         if cpt % 6 == 0:
             string += f"--- {lab_df[idx_df]} ---\n\n"
@@ -46,39 +58,41 @@ def write_report(a_list):
 
         cpt += 1
 
-        if len(df["stat"]) == 1:
-            grb = int(df["df"]
-                      .groupby(df["stat"])
-                      .count()
-                      .sort_values(by=df["stat"], ascending=False)
-                      .head(3)
-                      .sum()
-                      .mean())
+        entries = charted.loc[charted.table == number]
+        chart = df["df"].iloc[entries.row.to_numpy()]
+        chart.insert(0, 'Pos', entries['rank'].to_numpy())
 
-        else:
-            grb = int(df["df"]
-                      .groupby(df["stat"])
-                      .count()
-                      .sort_values(by=df["stat"], ascending=[False, False])
-                      .head(3)
-                      .sum()
-                      .mean())
+        if entries.move.any():
+            chart.insert(1, 'Move', entries.move.to_numpy())
 
-        string += df["df"].head(grb).to_string() + '\n' * 2 + '/' * 115 + '\n' * 2
+        string += chart.to_string() + '\n' * 2 + '/' * 115 + '\n' * 2
 
     return string
 
 
-def make_report(source_alltime, source_week, week_num):
-    at_xlsx = pd.ExcelFile(source_alltime)
-    we_xlsx = pd.ExcelFile(source_week)
+@run_metrics.timed('report')
+def make_report(source_alltime, source_week, week_num, year, top_n=3):
+    """
+    A function to write the notes of a week.
+
+    :param source_alltime: All time sheets, as returned by 'data_collection.export'
+    (result['all_time']), or the path of the all time workbook.
+    :param source_week: Weekly sheets (result['week']), or the path of the weekly workbook.
+    :param week_num: ISO number of the week.
+    :param year: ISO year of the week.
+    :param top_n: Number of positions in each chart (ties share a position).
+    """
 
-    at_lst = build_iterators(at_xlsx)
-    we_lst = build_iterators(we_xlsx)
+    at_lst = build_iterators(source_alltime, 'all_time')
+    we_lst = build_iterators(source_week, 'week')
 
     merged_list = build_list_we(we_lst, at_lst)
 
-    report = write_report(merged_list)
+    ranks = ranking.add_movement(ranking.rank_tables(merged_list),
+                                 ranking.load_ranks(*ranking.previous_week(year, week_num)))
+    ranking.save_ranks(ranks, year, week_num)
+
+    report = write_report(merged_list, ranks, top_n)
     print(report)
 
     with open(f"../weekly_reports/weekly_notes/W{week_num}_Notes.txt", "w",
@@ -86,7 +100,12 @@ def make_report(source_alltime, source_week, week_num):
         text_file.write(report)
 
 
-def build_iterators(xlsx_source):
+def build_iterators(source, period):
+    if isinstance(source, dict):
+        sheets = source
+    else:
+        sheets = read_sheets(source)
+
     prefix = ['By_Track_', 'By_Artist_', 'By_Label_']
     suffix = [{'plat': 'YouTube', 'stats': ["YouTube_Views"]},
               {'plat': '1001Tracklists', 'stats': ['1001T_Supports', '1001T_TotPlays']},
@@ -97,18 +116,35 @@ def build_iterators(xlsx_source):
     for pre in prefix:
         for suf in suffix:
             list_from_source.append(
-                {"df": pd.read_excel(xlsx_source, f'{pre}{suf["plat"]}'),
-                 'stat': suf["stats"]})
+                {"df": sheets[f'{pre}{suf["plat"]}'],
+                 'stat': suf["stats"],
+                 'period': period,
+                 'entity': pre[3:-1],
+                 'plat': suf["plat"]})
 
     return list_from_source
 
 
+def read_sheets(xlsx_source):
+    """
+    A function to read every sheet of a workbook in a single pass, with the fastest
+    reader available (calamine if installed, openpyxl in read-only mode otherwise).
+
+    :param xlsx_source: Path of the workbook (or an open 'pd.ExcelFile').
+    :return: A dictionary associating sheet name and dataframe.
+    """
+
+    if isinstance(xlsx_source, pd.ExcelFile):
+        return pd.read_excel(xlsx_source, sheet_name=None)
+
+    return pd.read_excel(xlsx_source, sheet_name=None, engine=excel_engine)
+
+
 " - MAIN PART -"
 
 if __name__ == '__main__':
     w_num = 4
-    report_source_alltime = pd.ExcelFile('../files/2021 Charts OUT All Time.xlsx')
-    report_source_week = pd.ExcelFile(
-        f'../weekly_reports/weekly_data/2021 Charts Week {w_num}.xlsx')
+    report_source_alltime = '../files/2021 Charts OUT All Time.xlsx'
+    report_source_week = f'../weekly_reports/weekly_data/2021 Charts Week {w_num}.xlsx'
 
-    make_report(report_source_alltime, report_source_week, w_num)
+    make_report(report_source_alltime, report_source_week, w_num, 2021)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+
+import email
+import json
+import re
+import threading
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: stubs.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Serve local copies of the scraped pages and of the YouTube API, so the
+collectors of 'data_collection.py' can be run and timed without touching the real
+websites.
+
+- Summary -
+
+1. Build minimal pages carrying the same markup as the real ones.
+2. Serve them from a local HTTP server running in a background thread.
+3. Answer 'videos.list' requests (single or batched) like the YouTube Data API.
+
+"""
+
+""" - LOCAL FUNCTIONS - """
+
+
+def page_1001tracklists(supports, plays):
+    """
+    A function to build a 1001Tracklists track page.
+
+    :param supports: Number of unique DJ supports displayed on the page.
+    :param plays: Number of tracklist plays displayed on the page.
+    :return: The page as bytes.
+    """
+
+    return (f'<html><head><title>1001Tracklists</title></head><body>'
+            f'<div class="trackInfo">'
+            f'<span class="badge spR" title="total unique DJ supports">{supports}x</span>'
+            f'<div class="c">Total Tracklist Plays: {plays}x</div>'
+            f'</div></body></html>').encode('utf-8')
+
+
+def page_1001tracklists_blocked():
+    """
+    A function to build the page 1001Tracklists sends to a blocked IP.
+
+    :return: The page as bytes.
+    """
+
+    return (b'<html><head><title>1001Tracklists</title></head><body>'
+            b'<p>Your IP has been blocked due to abnormal use.</p></body></html>')
+
+
+def page_soundcloud(plays):
+    """
+    A function to build a Soundcloud track page.
+
+    :param plays: Number of plays displayed on the page.
+    :return: The page as bytes.
+    """
+
+    return (f'<html><head><title>Soundcloud</title>'
+            f'<meta content="{plays}" property="soundcloud:play_count"/>'
+            f'</head><body></body></html>').encode('utf-8')
+
+
+def serve(respond, delay=0):
+    """
+    A function to run a local HTTP server.
+
+    :param respond: A function called with (method, path, headers, body) for each request,
+    returning (status, content type, body as bytes).
+    :param delay: Seconds to wait before answering each request, to mimic a remote host.
+    :return: The running server and its base URL. Call 'server.shutdown()' to stop it.
+    """
+
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+        disable_nagle_algorithm = True
+
+        def answer(self):
+            if delay:
+                threading.Event().wait(delay)
+
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+            status, content_type, content = respond(self.command, self.path, self.headers,
+                                                    body)
+
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        do_GET = answer
+        do_POST = answer
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def serve_pages(pages, delay=0):
+    """
+    A function to serve pages from a local HTTP server.
+
+    :param pages: A dictionary associating a path (e.g. '/track/2wtq775p/') and a page
+    (bytes). Unknown paths are answered with a 404.
+    :param delay: Seconds to wait before answering each request, to mimic a remote host.
+    :return: The running server and its base URL. Call 'server.shutdown()' to stop it.
+    """
+
+    def respond(method, path, headers, body):
+        page = pages.get(path)
+
+        if page is None:
+            return 404, 'text/html; charset=utf-8', b''
+
+        return 200, 'text/html; charset=utf-8', page
+
+    return serve(respond, delay)
+
+
+def serve_proxy(block_after=None, blocked_page=b''):
+    """
+    A function to run a local forward HTTP proxy, standing for one egress of an
+    'EgressPool' in tests. It can get blocked like a real egress.
+
+    :param block_after: Number of requests forwarded before the proxy answers every
+    request with 'blocked_page' (None to never be blocked).
+    :param blocked_page: Page sent once blocked (e.g. 'page_1001tracklists_blocked()').
+    :return: The running server and its URL. The number of requests forwarded and
+    answered as blocked are counted in 'server.counts'.
+    """
+
+    counts = {'forwarded': 0, 'blocked': 0}
+    lock = threading.Lock()
+    opener = urllib.request.build_opener(urllib.request.ProxyHandler({}))
+
+    def respond(method, path, headers, body):
+        with lock:
+            blocked = block_after is not None and counts['forwarded'] >= block_after
+            counts['blocked' if blocked else 'forwarded'] += 1
+
+        if blocked:
+            return 200, 'text/html; charset=utf-8', blocked_page
+
+        try:
+            with opener.open(path, timeout=30) as response:
+                return response.status, response.headers.get('Content-Type', ''), \
+                    response.read()
+        except urllib.error.HTTPError as error:
+            return error.code, error.headers.get('Content-Type', ''), error.read()
+
+    server, base_url = serve(respond)
+    server.counts = counts
+
+    return server, base_url
+
+
+def serve_truncated(page, sent):
+    """
+    A function to serve a page cut short: the whole page is announced (Content-Length)
+    but the connection is closed after its first bytes, like a dropped download.
+
+    :param page: The page (bytes).
+    :param sent: Number of bytes sent before closing the connection.
+    :return: The running server and its base URL. Call 'server.shutdown()' to stop it.
+    """
+
+    class TruncatedHandler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(page)))
+            self.send_header('Connection', 'close')
+            self.end_headers()
+            self.wfile.write(page[:sent])
+            self.close_connection = True
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), TruncatedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server, f'http://127.0.0.1:{server.server_address[1]}'
+
+
+def serve_youtube(views, delay=0, batch_errors=0, request_errors=0):
+    """
+    A function to serve a local stand-in of the YouTube Data API ('videos.list' and the
+    batch endpoint), to be used through 'Create_Service(..., api_endpoint=base_url)'.
+
+    :param views: A dictionary associating video ID and views. Unknown IDs are left out
+    of the answers, like deleted or private videos.
+    :param delay: Seconds to wait before answering each request, to mimic a remote host.
+    :param batch_errors: Number of batch calls answered with a 503 (the first ones).
+    :param request_errors: Number of requests inside the batches answered with a 503 (the
+    first ones), their batch being answered.
+    :return: The running server and its base URL. Call 'server.shutdown()' to stop it.
+    The number of batch calls and of requests inside them are counted in 'server.counts'.
+    """
+
+    counts = {'batches': 0, 'requests': 0}
+    lock = threading.Lock()
+
+    def videos_list(path):
+        query = parse_qs(urlsplit(path).query)
+        ids = ','.join(query.get('id', [])).split(',')
+        items = [{'id': an_id, 'statistics': {'viewCount': str(views[an_id])}}
+                 for an_id in ids if an_id in views]
+
+        return json.dumps({'items': items}).encode('utf-8')
+
+    def respond(method, path, headers, body):
+        if method == 'GET' and urlsplit(path).path.endswith('/videos'):
+            return 200, 'application/json; charset=UTF-8', videos_list(path)
+
+        if method == 'POST' and urlsplit(path).path.startswith('/batch'):
+            with lock:
+                counts['batches'] += 1
+
+                if counts['batches'] <= batch_errors:
+                    return 503, 'application/json; charset=UTF-8', \
+                        b'{"error": {"code": 503, "message": "Backend Error"}}'
+
+            request = email.message_from_bytes(
+                f'Content-Type: {headers["Content-Type"]}\r\n\r\n'.encode('utf-8') + body)
+            boundary = f'batch_{uuid.uuid4().hex}'
+            parts = []
+
+            for part in request.get_payload():
+                content_id = re.sub(r'\r?\n', '', part['Content-ID']).strip('<>')
+                request_line = part.get_payload().lstrip().split('\n', 1)[0]
+                content = videos_list(request_line.split(' ')[1]).decode('utf-8')
+                status = '200 OK'
+
+                with lock:
+                    counts['requests'] += 1
+
+                    if counts['requests'] <= request_errors:
+                        status = '503 Service Unavailable'
+                        content = '{"error": {"code": 503, "message": "Backend Error"}}'
+
+                parts.append(f'--{boundary}\r\nContent-Type: application/http\r\n'
+                             f'Content-ID: <response-{content_id}>\r\n\r\n'
+                             f'HTTP/1.1 {status}\r\n'
+                             f'Content-Type: application/json; charset=UTF-8\r\n\r\n'
+                             f'{content}\r\n')
+
+            return 200, f'multipart/mixed; boundary={boundary}', \
+                (''.join(parts) + f'--{boundary}--\r\n').encode('utf-8')
+
+        return 404, 'application/json; charset=UTF-8', b'{}'
+
+    server, base_url = serve(respond, delay)
+    server.counts = counts
+
+    return server, base_url
+
+
+" - MAIN PART -"
+
+if __name__ == '__main__':
+    a_server, a_base_url = serve_pages({'/track/2wtq775p/': page_1001tracklists(143, 172)})
+    print(f'Serving on {a_base_url} (Ctrl+C to stop)')
+
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        a_server.shutdown()
@@ -0,0 +1,739 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import threading
+from functools import lru_cache, partial
+from time import sleep
+from urllib.parse import urlparse
+
+import pandas as pd
+import pytest
+
+import Google
+import aggregation
+import benchmarks
+import chart_dataset
+import data_collection as dc
+import exe
+import ingestion
+import metrics
+import ranking
+import report_writer as rw
+import stubs
+import workbook_writer
+from chart_export import export_tables
+from checkpoint_journal import CheckpointJournal
+from egress_pool import EgressPool, NoEgressLeft
+from fetch_policy import FetchFailed, FetchPolicy, PageGone
+from page_cache import PageCache
+from refresh_policy import RefreshStore
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: tests.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Check the collectors (failure paths included) and the offline stages, then
+benchmark each stage of the weekly run on synthetic catalogs, offline, and compare the
+timings with a stored baseline (pytest-benchmark).
+
+- Summary -
+
+1. Synthetic catalogs of 1k to 1M tracks ('benchmarks.synthetic_catalog').
+2. Local stub servers for the 1001Tracklists and Soundcloud pages, the YouTube API and
+   the egresses (proxies), some of them failing on purpose.
+3. Tests of the fetch policy, egress pool, page cache, refresh policy, checkpoint
+   journal, aggregation windows, ranking, charts dataset and command line.
+4. One benchmark per stage: 'find_alias', 'load_catalog' (cached), 'get_data', 'export',
+   'make_report' and 'read_chart' (charts dataset).
+
+Usage (from the 'code' folder):
+    - pytest tests.py                                  run the tests and the benchmarks
+    - pytest tests.py --benchmark-skip                 run the tests only
+    - pytest tests.py --benchmark-save=<name>          store a baseline
+    - pytest tests.py --benchmark-compare=0001 --benchmark-compare-fail=mean:25%
+                                                       compare with baseline 0001
+
+Baselines are stored in 'files/benchmarks' (see 'pytest.ini'). The largest catalogs are
+only used when the environment variables 'BENCHMARK_MAX_ROWS' (default 100000, for the
+offline stages) and 'BENCHMARK_MAX_NETWORK_ROWS' (default 1000, for 'get_data') allow it.
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+catalog_sizes = [1_000, 10_000, 100_000, 1_000_000]
+max_rows = int(os.environ.get('BENCHMARK_MAX_ROWS', 100_000))
+max_network_rows = int(os.environ.get('BENCHMARK_MAX_NETWORK_ROWS', 1_000))
+
+week_start, week_end, week_number, month_number = '2021-05-24', '2021-05-30', 21, 12
+
+""" - LOCAL FUNCTIONS - """
+
+
+@lru_cache(maxsize=None)
+def catalog(rows):
+    """
+    A function to build a synthetic catalog once per session.
+
+    :param rows: Number of tracks.
+    :return: A dataframe of tracks, aliases expanded (copy it before modifying it).
+    """
+
+    return dc.find_alias(benchmarks.synthetic_catalog(rows))
+
+
+@lru_cache(maxsize=None)
+def collected(rows):
+    """
+    A function to give random statistics to a synthetic catalog, as 'get_data' would.
+
+    :param rows: Number of tracks.
+    :return: A dataframe of tracks with their statistics.
+    """
+
+    data_frame = catalog(rows)
+    numbers = data_frame.index.to_series()
+
+    return data_frame.assign(YouTube_Views=numbers * 37 % 100_003,
+                             **{'1001T_TotPlays': numbers * 7 % 503,
+                                '1001T_Supports': numbers * 3 % 101},
+                             Soundcloud_Plays=numbers * 13 % 20_011)
+
+
+def sizes(limit):
+    """
+    A function to list the catalog sizes to benchmark.
+
+    :param limit: Largest size allowed.
+    :return: A list of sizes.
+    """
+
+    return [rows for rows in catalog_sizes if rows <= limit]
+
+
+def stub_sites(data_frame):
+    """
+    A function to serve every page and video of a catalog from local stubs.
+
+    :param data_frame: A catalog.
+    :return: The servers, the base URLs of 1001Tracklists, Soundcloud and YouTube, and
+    the values served (dictionary associating platform and {ID: value}).
+    """
+
+    tracklists = data_frame['1001Tracklists_ID'].dropna().unique()
+    links = dc.platform_index(data_frame, dc.soundcloud_link_prefix).platform_id.unique()
+    videos = dc.platform_index(data_frame, dc.youtube_id_prefix).platform_id.unique()
+
+    values = {'1001tracklists': {an_id: (i % 97, i % 503)
+                                 for i, an_id in enumerate(tracklists)},
+              'soundcloud': {link: i % 20_011 for i, link in enumerate(links)},
+              'youtube': {video: i % 100_003 for i, video in enumerate(videos)}}
+
+    servers_and_urls = [
+        stubs.serve_pages({f'/track/{an_id}/': stubs.page_1001tracklists(*value)
+                           for an_id, value in values['1001tracklists'].items()}),
+        stubs.serve_pages({f'/{link}/': stubs.page_soundcloud(plays)
+                           for link, plays in values['soundcloud'].items()}),
+        stubs.serve_youtube(values['youtube'])]
+
+    return [server for server, _ in servers_and_urls], \
+        [base_url for _, base_url in servers_and_urls], values
+
+
+""" - FIXTURES - """
+
+
+@pytest.fixture(autouse=True)
+def metrics_folder(tmp_path, monkeypatch):
+    """
+    Write the metrics of every test in its temporary folder, not in 'files/metrics'.
+    """
+
+    monkeypatch.setattr(metrics.run_metrics, 'folder', str(tmp_path / 'files/metrics'))
+
+    return tmp_path / 'files/metrics'
+
+
+@pytest.fixture
+def workspace(tmp_path, monkeypatch):
+    """
+    Run a test from the 'code' folder of an empty copy of the repository layout, with
+    the page cache off.
+    """
+
+    for folder in ['code', 'files', 'weekly_reports/weekly_data',
+                   'weekly_reports/weekly_notes', 'monthly_reports/monthly_data']:
+        (tmp_path / folder).mkdir(parents=True)
+
+    monkeypatch.chdir(tmp_path / 'code')
+    monkeypatch.setattr(dc, 'page_cache', PageCache(str(tmp_path / 'files/page_cache'),
+                                                    mode='off'))
+    monkeypatch.setattr(Google, 'discovery_folder', str(tmp_path / 'files/discovery'))
+
+    return tmp_path
+
+
+@pytest.fixture
+def quick_policy(monkeypatch):
+    """
+    Retry at once (3 attempts), through a single egress that is never renewed.
+    """
+
+    monkeypatch.setattr(dc, 'fetch_policy', FetchPolicy(attempts=3, base_delay=0.01,
+                                                        max_delay=0.01, timeout=5))
+    monkeypatch.setattr(dc, 'egress_pool', EgressPool([None], renew=None))
+
+    return dc.fetch_policy
+
+
+""" - TESTS - """
+
+
+def test_server_errors_are_retried(workspace, quick_policy):
+    answers = iter([503, 429])
+    page = stubs.page_1001tracklists(3, 40)
+    server, base_url = stubs.serve(lambda *request: (next(answers, 200), 'text/html', page))
+
+    try:
+        assert dc.fetch_page(f'{base_url}/track/t1/') == page
+    finally:
+        server.shutdown()
+
+
+def test_server_errors_are_never_parsed(workspace, quick_policy, monkeypatch):
+    monkeypatch.setattr(dc, 'page_cache', PageCache(str(workspace / 'files/page_cache'),
+                                                    mode='record'))
+    server, base_url = stubs.serve(lambda *request: (503, 'text/html',
+                                                     stubs.page_1001tracklists(0, 1)))
+    page_link = f'{base_url}/track/t1/'
+
+    try:
+        with pytest.raises(FetchFailed):
+            dc.fetch_page(page_link)
+    finally:
+        server.shutdown()
+
+    assert quick_policy.breaker(page_link).failures == quick_policy.attempts
+    assert dc.page_cache.get(page_link) is None
+
+
+def test_truncated_responses_are_retried(workspace, quick_policy):
+    server, base_url = stubs.serve_truncated(stubs.page_soundcloud(5), sent=20)
+
+    try:
+        with pytest.raises(FetchFailed):
+            dc.soundcloud_scrapping('artist/track', base_url)
+    finally:
+        server.shutdown()
+
+    assert quick_policy.breaker(base_url).failures == quick_policy.attempts
+
+
+@pytest.mark.parametrize('errors', [{'batch_errors': 1}, {'request_errors': 1}])
+def test_youtube_errors_are_retried(workspace, quick_policy, errors):
+    views = {f'video{number}': number for number in range(120)}  # 3 requests of 50 IDs
+    server, base_url = stubs.serve_youtube(views, **errors)
+    data_frame = pd.DataFrame({'YouTube_ID1': list(views),
+                               'Release_Date': pd.Timestamp('2021-05-24')})
+
+    try:
+        result = dc.get_youtube_data(data_frame, api_endpoint=base_url)
+    finally:
+        server.shutdown()
+
+    assert result.YouTube_Views.tolist() == list(views.values())
+    assert server.counts == {'batches': 2, 'requests': 3 + errors.get('request_errors', 0)}
+
+
+def test_deleted_pages_do_not_retire_the_egress(workspace, quick_policy):
+    requests_seen = []
+    server, base_url = stubs.serve(lambda *request: requests_seen.append(request) or
+                                   (404, 'text/html', b'<html>Not found</html>'))
+
+    try:
+        with pytest.raises(PageGone):
+            dc.soundcloud_scrapping('artist/deleted-track', base_url)
+    finally:
+        server.shutdown()
+
+    assert len(requests_seen) == 1
+    assert dc.egress_pool.egresses[0].retired_until == {}
+
+
+def test_blocked_proxy_is_retired_for_its_host(workspace, quick_policy, monkeypatch):
+    site, site_url = stubs.serve_pages({'/track/t1/': stubs.page_1001tracklists(3, 40)})
+    blocked, blocked_url = stubs.serve_proxy(
+        block_after=0, blocked_page=stubs.page_1001tracklists_blocked())
+    working, working_url = stubs.serve_proxy()
+    pool = EgressPool([blocked_url, working_url], renew=None)
+    monkeypatch.setattr(dc, 'egress_pool', pool)
+
+    try:
+        assert dc.get_1001tracklists_track_data('t1', site_url) == (3, 40)
+    finally:
+        for server in (site, blocked, working):
+            server.shutdown()
+
+    assert blocked.counts == {'forwarded': 0, 'blocked': 1}
+    assert working.counts == {'forwarded': 1, 'blocked': 0}
+    assert urlparse(site_url).netloc in pool.egresses[0].retired_until
+    assert pool.acquire('soundcloud.com')[0] is pool.egresses[0]
+
+
+def test_egress_pool_ignores_blocks_from_before_a_renewal():
+    renewals = []
+    pool = EgressPool([None], renew=lambda: renewals.append(True))
+
+    egress, generation = pool.acquire('host')
+    pool.retire(egress, 'host', generation)
+    pool.release(egress, False, 'host', generation)
+
+    renewed, new_generation = pool.acquire('host')  # Every egress retired: renewed
+    pool.retire(egress, 'host', generation)  # Late block of a request sent before
+    pool.release(renewed, True, 'host', new_generation)
+
+    assert (renewals, new_generation) == ([True], generation + 1)
+    assert pool.acquire('host') == (egress, new_generation)
+    assert renewals == [True]
+
+
+def test_egress_pool_retires_per_host():
+    pool = EgressPool([None], renew=None)
+
+    egress, generation = pool.acquire('soundcloud.com')
+    pool.retire(egress, 'soundcloud.com', generation)
+    pool.release(egress, False, 'soundcloud.com', generation)
+
+    with pytest.raises(NoEgressLeft):
+        pool.acquire('soundcloud.com')
+
+    assert pool.acquire('www.1001tracklists.com')[0] is egress
+
+
+def test_egress_pool_renews_without_the_lock():
+    renewing, resume, renewals = threading.Event(), threading.Event(), []
+
+    def renew():
+        renewals.append(True)
+        renewing.set()
+        resume.wait(5)
+
+    pool = EgressPool([None], renew=renew)
+    egress, generation = pool.acquire('host')
+    pool.retire(egress, 'host', generation)
+    pool.release(egress, False, 'host', generation)
+
+    acquired = []
+    workers = [threading.Thread(target=lambda: acquired.append(pool.acquire('host')))
+               for _ in range(3)]
+
+    for worker in workers:
+        worker.start()
+
+    assert renewing.wait(5)
+    assert pool.acquire('other.host')[0] is egress  # Not stuck behind the renewal
+    resume.set()
+
+    for worker in workers:
+        worker.join(5)
+
+    assert renewals == [True]
+    assert acquired == [(egress, generation + 1)] * 3
+
+
+def test_not_collected_ids_keep_their_last_value(workspace, quick_policy):
+    server, base_url = stubs.serve_pages({'/artist/alive/': stubs.page_soundcloud(5)})
+    store = RefreshStore(str(workspace / 'files/refresh_store.json'))
+    store.start_run()
+    store.record('soundcloud', {'artist/deleted': 77})
+    store.start_run()
+    data_frame = pd.DataFrame({
+        'Soundcloud_Link1': ['artist/alive', 'artist/deleted', 'artist/never-seen', None],
+        'Release_Date': pd.Timestamp.now().normalize()})  # Recent: every ID is fetched
+
+    try:
+        result = dc.get_soundcloud_data(data_frame, store, base_url=base_url)
+    finally:
+        server.shutdown()
+
+    assert result.Soundcloud_Plays.tolist() == [5, 77, pd.NA, 0]
+    assert store.last_values('soundcloud', ['artist/alive', 'artist/never-seen']) == \
+        {'artist/alive': 5}
+
+
+def test_failed_platform_keeps_its_last_values(workspace, monkeypatch):
+    def fail(*args, **kwargs):
+        raise RuntimeError('site down')
+
+    monkeypatch.setattr(dc, 'get_1001tracklists_data', fail)
+    store = RefreshStore(str(workspace / 'files/refresh_store.json'))
+    store.start_run()
+    store.record('1001tracklists', {'t1': (3, 40)})
+    data_frame = pd.DataFrame({'1001Tracklists_ID': ['t1', 't2', None],
+                               'Release_Date': pd.Timestamp('2021-05-24')})
+
+    result = dc.get_data(data_frame, refresh_store=store, platforms=['1001tracklists'])
+
+    assert result['1001T_Supports'].tolist() == [3, pd.NA, 0]
+    assert result['1001T_TotPlays'].tolist() == [40, pd.NA, 0]
+
+
+def test_given_up_ids_are_not_journaled(workspace, quick_policy):
+    server, base_url = stubs.serve(lambda *request: (503, 'text/html', b''))
+    journal = CheckpointJournal(str(workspace / 'files/journal.sqlite'), 'week')
+    data_frame = pd.DataFrame({'1001Tracklists_ID': ['t1', 't2'],
+                               'Release_Date': pd.Timestamp('2021-05-24')})
+
+    try:
+        result = dc.get_1001tracklists_data(data_frame, base_url=base_url, journal=journal)
+    finally:
+        server.shutdown()
+        journal.close()
+
+    assert result['1001T_Supports'].isna().all() and result['1001T_TotPlays'].isna().all()
+    assert CheckpointJournal(str(workspace / 'files/journal.sqlite'), 'week') \
+        .done('1001tracklists') == {}
+
+
+def test_1001tracklists_requests_reach_the_cap(workspace, quick_policy):
+    max_per_host, lock = 40, threading.Lock()
+    in_flight = {'now': 0, 'peak': 0}
+
+    def respond(*request):
+        with lock:
+            in_flight['now'] += 1
+            in_flight['peak'] = max(in_flight['peak'], in_flight['now'])
+
+        sleep(0.5)
+
+        with lock:
+            in_flight['now'] -= 1
+
+        return 200, 'text/html', stubs.page_1001tracklists(1, 2)
+
+    server, base_url = stubs.serve(respond)
+
+    try:
+        results = asyncio.run(dc.get_1001tracklists_data_async(
+            [f't{number}' for number in range(max_per_host)], max_per_host, base_url))
+    finally:
+        server.shutdown()
+
+    assert set(results.values()) == {(1, 2)}
+    assert in_flight['peak'] > 32  # Above the cap of the default executor of asyncio
+
+
+def test_refresh_is_staggered(tmp_path):
+    store = RefreshStore(str(tmp_path / 'refresh_store.json'), stale_every=4)
+    ids = [f'video{number}' for number in range(1_000)]
+    old_releases = {an_id: pd.Timestamp('2015-01-01') for an_id in ids}
+    fetches = dict.fromkeys(ids, 0)
+
+    store.start_run()
+    store.record('youtube', dict.fromkeys(ids, 10))
+
+    for _ in range(8):
+        store.start_run()
+        due, _ = store.split('youtube', ids, old_releases)
+        store.record('youtube', dict.fromkeys(due, 10))
+
+        assert 150 <= len(due) <= 350
+
+        for an_id in due:
+            fetches[an_id] += 1
+
+    assert set(fetches.values()) == {2}
+
+
+def test_eviction_keeps_shared_page_bodies(tmp_path):
+    cache = PageCache(str(tmp_path), max_bytes=250, mode='record')
+
+    for url, body in [('u1', b'a'), ('u2', b'b'), ('u3', b'a'), ('u4', b'c')]:
+        cache.put(url, body * 100)
+        sleep(0.01)  # Distinct fetch times: evicted from the oldest
+
+    cache.mode = 'replay'
+
+    assert [cache.get(url) for url in ['u1', 'u2', 'u3', 'u4']] == \
+        [None, None, b'a' * 100, b'c' * 100]
+    assert cache.size == 200
+
+
+def test_journal_resumes_a_run(tmp_path):
+    path = str(tmp_path / 'journal.sqlite')
+    journal = CheckpointJournal(path, '2021-05-24_2021-05-30')
+    journal.record('1001tracklists', {'t1': (3, 40)})
+    journal.record('youtube', {'v1': 5})
+    journal.close()
+
+    resumed = CheckpointJournal(path, '2021-05-24_2021-05-30')
+
+    assert resumed.done('1001tracklists') == {'t1': [3, 40]}
+    assert CheckpointJournal(path, 'another run').done('youtube') == {}
+
+    resumed.finish('youtube')
+
+    assert resumed.done('youtube') == {}
+    assert resumed.done('1001tracklists') == {'t1': [3, 40]}
+
+
+def test_catalog_has_the_same_types_from_the_cache(workspace):
+    path = str(workspace / 'files/catalog.xlsx')
+    benchmarks.synthetic_catalog(100).assign(Track_Name=[2021, 'Track'] * 50) \
+        .to_excel(path, index=False)  # Track names read as numbers and text
+
+    loaded = ingestion.load_catalog(path)
+
+    pd.testing.assert_frame_equal(loaded, ingestion.load_catalog(path))
+
+
+def test_release_windows():
+    day = pd.Timestamp
+
+    assert aggregation.iso_week_window(2021, 21) == (day('2021-05-24'), day('2021-05-30'))
+    assert aggregation.iso_week_window(2021, 1) == (day('2021-01-04'), day('2021-01-10'))
+    assert aggregation.month_window(2024, 2) == (day('2024-02-01'), day('2024-02-29'))
+    assert aggregation.quarter_window(2021, 2) == (day('2021-04-01'), day('2021-06-30'))
+    assert aggregation.rolling_window('2021-05-30', 7) == (day('2021-05-24'),
+                                                          day('2021-05-30'))
+    assert aggregation.year_window(2021) == (day('2021-01-01'), day('2021-12-31'))
+
+
+@pytest.mark.parametrize('window', [(None, None), ('2021-05-24', '2021-05-30'),
+                                    ('2021-01-01', '2021-03-31'),
+                                    ('1900-01-01', '1900-01-31')])
+def test_entity_tables_match_a_plain_group_by(window):
+    by_track = collected(1_000)
+    index = aggregation.ReleaseIndex(by_track)
+    start, end = window
+    in_window = by_track if start is None else \
+        by_track.loc[by_track.Release_Date.between(start, end)]
+    metric_columns = index.metrics
+
+    for entity_type, column in aggregation.entity_columns.items():
+        credited = in_window.assign(**{column: in_window[column].fillna('NONE')
+                                       .str.split(', ')}).explode(column)
+        credited = credited.loc[credited[column] != aggregation.skipped_entities
+                                .get(entity_type)]
+        expected = credited.groupby(column)[metric_columns].sum()
+
+        pd.testing.assert_frame_equal(index.entity_table(entity_type, start, end),
+                                      expected, check_dtype=False, check_index_type=False)
+
+
+def test_ranks_are_dense_with_missing_statistics_last():
+    tracks = pd.DataFrame({'Artist': ['A', 'B', 'C', 'D', 'E'],
+                           'YouTube_Views': pd.array([9, 4, 9, None, 1], dtype='Int64')})
+    table = {'df': tracks.sort_values('YouTube_Views', ascending=False),
+             'stat': ['YouTube_Views'], 'period': 'week', 'entity': 'Artist',
+             'plat': 'YouTube'}
+
+    ranks = ranking.rank_tables([table])
+
+    assert dict(zip(ranks.name, ranks['rank'])) == {'A': 1, 'C': 1, 'B': 2, 'E': 3, 'D': 4}
+
+
+def test_ranks_are_kept_by_iso_week(tmp_path):
+    ranks = pd.DataFrame({'period': 'week', 'entity': 'Artist', 'platform': 'YouTube',
+                          'name': ['A', 'B'], 'rank': [1, 2]})
+
+    ranking.save_ranks(ranks, 2020, 53, str(tmp_path))
+
+    assert ranking.previous_week(2021, 1) == (2020, 53)
+    assert ranking.previous_week(2021, 21) == (2021, 20)
+    assert ranking.load_ranks(2021, 53, str(tmp_path)) is None
+    pd.testing.assert_frame_equal(
+        ranking.load_ranks(*ranking.previous_week(2021, 1), str(tmp_path)), ranks)
+
+
+def test_chart_dataset_answers_like_the_sheets(workspace):
+    exported = export_tables(collected(1_000), 1, week_start, week_end, week_number,
+                             workbooks=False)
+    sheet = exported['week']['By_Artist_Soundcloud']
+    chart = chart_dataset.read_chart('Soundcloud', 'Artist', f'2021-W{week_number}')
+    artist = chart.name.iloc[0]
+    history = chart_dataset.artist_history(artist, 'Soundcloud')
+
+    assert chart.name.tolist() == sheet.Artist.tolist()
+    assert chart.Soundcloud_Plays.tolist() == sheet.Soundcloud_Plays.tolist()
+    assert history.loc[history.period == f'2021-W{week_number}', 'rank'].tolist() == [1]
+
+
+@pytest.mark.parametrize('week', [('2021-12-27', '2022-01-02', 52, 2021, 2022),
+                                  ('2020-12-28', '2021-01-03', 53, 2020, 2021)])
+def test_weeks_across_new_year_keep_their_iso_year(workspace, week):
+    start, end, number, iso_year, month_year = week
+    charts_folder = str(workspace / 'files/charts_dataset')
+
+    export_tables(collected(1_000), 1, start, end, number, workbooks=False,
+                  charts_folder=charts_folder)
+    periods = {path.name for path in (workspace / 'files/charts_dataset/platform=YouTube'
+                                      / 'entity=Artist').iterdir()}
+
+    assert aggregation.iso_year(end) == iso_year
+    assert periods == {f'period={iso_year}-W{number}', f'period={month_year}-01',
+                       f'period=all_time-{iso_year}-W{number}'}
+
+
+def test_command_line_stages(workspace):
+    assert exe.week_dates(week_number=week_number, year=2021) == (week_start, week_end,
+                                                                 week_number)
+    stage = ['--week', str(week_number), '--year', '2021', '--months', '1']
+
+    with pytest.raises(SystemExit):
+        exe.main(['export', '--start', week_start] + stage)
+
+    with pytest.raises(SystemExit, match='Nothing collected'):
+        exe.main(['export'] + stage)
+
+    os.makedirs(exe.collected_folder)
+    collected(1_000).to_parquet(exe.collected_path(week_start, week_end))
+
+    exe.main(['export'] + stage)
+    exe.main(['report'] + stage)
+
+    assert os.path.exists(workbook_writer.workbook_path('week', 2021, week_number))
+    assert os.path.exists(f'../weekly_reports/weekly_notes/W{week_number}_Notes.txt')
+
+
+def test_collect_closes_its_journal(workspace, monkeypatch):
+    journals = []
+
+    def get_data(data_frame, journal=None, platforms=None, **kwargs):
+        journals.append(journal)
+        return collected(1_000)[['Artist', 'YouTube_Views']]
+
+    monkeypatch.setattr(dc, 'get_data', get_data)
+    monkeypatch.setattr(dc, 'journal_path', str(workspace / 'files/journal.sqlite'))
+    monkeypatch.setattr(dc, 'refresh_store_path', str(workspace / 'files/store.json'))
+    benchmarks.synthetic_catalog(1_000).to_parquet(workspace / 'files/catalog.parquet')
+
+    by_track = exe.collect(str(workspace / 'files/catalog.parquet'), week_start, week_end,
+                           ['youtube'])
+
+    with pytest.raises(Exception, match='closed'):
+        journals[0].done('youtube')
+
+    assert by_track['Soundcloud_Plays'].isna().all()
+
+
+def test_command_line_uses_the_iso_year_and_cache_mode(workspace, monkeypatch):
+    calls = []
+    monkeypatch.setattr(exe, 'collect', lambda *args: calls.append(args))
+    monkeypatch.setattr(rw, 'make_report', lambda *args: calls.append(args))
+    stage = ['--week', '52', '--year', '2021']
+
+    exe.main(['collect', '--cache-mode', 'replay'] + stage)
+    exe.main(['report'] + stage)
+
+    with pytest.raises(SystemExit):
+        exe.main(['collect', '--cache-mode', 'online'] + stage)
+
+    assert calls == [(exe.catalog_path, '2021-12-27', '2022-01-02', None, 'replay'),
+                     (workbook_writer.workbook_path('all_time', 2021),
+                      workbook_writer.workbook_path('week', 2021, 52), 52, 2021)]
+
+
+""" - BENCHMARKS - """
+
+
+@pytest.mark.parametrize('rows', sizes(max_rows))
+def test_find_alias(benchmark, rows):
+    data_frame = benchmarks.synthetic_catalog(rows)
+
+    result = benchmark.pedantic(dc.find_alias, setup=lambda: ((data_frame.copy(),), {}),
+                                rounds=3)
+
+    assert len(result) == rows
+
+
+@pytest.mark.parametrize('rows', sizes(max_rows))
+def test_load_catalog(benchmark, rows, workspace):
+    source = str(workspace / 'files/catalog.csv')
+    benchmarks.synthetic_catalog(rows).to_csv(source, index=False)
+    expected = ingestion.load_catalog(source)  # Fills the cache
+
+    result = benchmark.pedantic(ingestion.load_catalog, args=(source,), rounds=3)
+
+    assert result.Artist.equals(expected.Artist)
+
+
+@pytest.mark.parametrize('rows', sizes(max_network_rows))
+def test_get_data(benchmark, rows, workspace, monkeypatch):
+    data_frame = catalog(rows)
+    servers, (tracklists_url, soundcloud_url, youtube_url), values = stub_sites(data_frame)
+
+    monkeypatch.setattr(dc, 'get_1001tracklists_data',
+                        partial(dc.get_1001tracklists_data, base_url=tracklists_url))
+    monkeypatch.setattr(dc, 'get_soundcloud_data',
+                        partial(dc.get_soundcloud_data, base_url=soundcloud_url,
+                                rate=10_000, burst=100))
+    monkeypatch.setattr(dc, 'get_youtube_data',
+                        partial(dc.get_youtube_data, api_endpoint=youtube_url))
+
+    try:
+        result = benchmark.pedantic(dc.get_data, setup=lambda: ((data_frame.copy(),), {}),
+                                    rounds=3)
+    finally:
+        for server in servers:
+            server.shutdown()
+
+    tracklists = dc.platform_index(data_frame, '1001Tracklists_ID')
+    tracklists = tracklists.loc[~tracklists.platform_id.isin(dc.exception_1001T)]
+    expected = {
+        'YouTube_Views': (dc.platform_index(data_frame, dc.youtube_id_prefix),
+                          values['youtube']),
+        'Soundcloud_Plays': (dc.platform_index(data_frame, dc.soundcloud_link_prefix),
+                             values['soundcloud']),
+        '1001T_Supports': (tracklists, {an_id: supports for an_id, (supports, _)
+                                        in values['1001tracklists'].items()}),
+        '1001T_TotPlays': (tracklists, {an_id: plays for an_id, (_, plays)
+                                        in values['1001tracklists'].items()})}
+
+    for column, (id_index, column_values) in expected.items():
+        assert result[column].tolist() == \
+            dc.fan_out(id_index, column_values, data_frame.index).tolist()
+
+
+@pytest.mark.parametrize('rows', sizes(max_rows))
+def test_export(benchmark, rows, workspace, monkeypatch):
+    by_track = collected(rows)
+    monkeypatch.setattr(dc, 'get_data', lambda data_frame, *args, **kwargs: by_track)
+
+    def setup():
+        if os.path.exists(workbook_writer.manifest_path):
+            os.remove(workbook_writer.manifest_path)
+        return (by_track, month_number, week_start, week_end, week_number), {}
+
+    result = benchmark.pedantic(dc.export, setup=setup, rounds=3)
+
+    assert set(result) == {'all_time', 'week'} | {f'month_{m}' for m in range(1, 13)}
+
+
+@pytest.mark.parametrize('rows', sizes(max_rows))
+def test_make_report(benchmark, rows, workspace, monkeypatch):
+    by_track = collected(rows)
+    monkeypatch.setattr(dc, 'get_data', lambda data_frame, *args, **kwargs: by_track)
+    exported = dc.export(by_track, 1, week_start, week_end, week_number)
+
+    benchmark.pedantic(rw.make_report, args=(exported['all_time'], exported['week'],
+                                             week_number, 2021), rounds=3)
+
+    assert os.path.exists(f'../weekly_reports/weekly_notes/W{week_number}_Notes.txt')
+
+
+@pytest.mark.parametrize('rows', sizes(max_rows))
+def test_read_chart(benchmark, rows, workspace, monkeypatch):
+    by_track = collected(rows)
+    monkeypatch.setattr(dc, 'get_data', lambda data_frame, *args, **kwargs: by_track)
+    exported = dc.export(by_track, 1, week_start, week_end, week_number)
+
+    result = benchmark.pedantic(chart_dataset.read_chart,
+                                args=('YouTube', 'Track', f'2021-W{week_number}', 10),
+                                rounds=3)
+
+    expected = exported['week']['By_Track_YouTube'].YouTube_Views.head(len(result))
+    assert (result.YouTube_Views.to_numpy() == expected.to_numpy()).all()
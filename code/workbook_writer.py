@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+
+import numpy as np
+import pandas as pd
+import xlsxwriter
+
+from metrics import run_metrics
+from page_cache import write_atomic
+
+""" - SCRIPT INFORMATION - """
+
+"""
+@file_name: workbook_writer.py
+@author: Dylan "dyl-m" Monfret
+
+Objective: Write the exported workbooks as fast as possible, and only those whose data
+changed since the last export.
+
+- Summary -
+
+1. Hash the sheets of each workbook and compare with the hash saved at the last export.
+2. Write the workbooks that changed in parallel, one process per workbook.
+3. Stream each sheet row by row to disk (xlsxwriter 'constant_memory' mode).
+
+"""
+
+""" - PREPARATORY ELEMENTS - """
+
+manifest_path = '../files/export_manifest.json'
+
+alltime_folder = '../files/'
+weekly_folder = '../weekly_reports/weekly_data/'
+monthly_folder = '../monthly_reports/monthly_data/'
+
+""" - LOCAL FUNCTIONS - """
+
+
+def cell_value(value):
+    """
+    A function to convert a dataframe value into a value xlsxwriter can write.
+
+    :param value: A value from a dataframe.
+    :return: The converted value (None for missing values).
+    """
+
+    if isinstance(value, np.generic):
+        value = value.item()
+
+    if value is None or value is pd.NA or value is pd.NaT or \
+            (isinstance(value, float) and np.isnan(value)):
+        return None
+
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+
+    return value
+
+
+def sheets_hash(sheets):
+    """
+    A function to hash the content of a workbook.
+
+    :param sheets: A dictionary associating sheet name and (dataframe, write index).
+    :return: Hexadecimal digest of the sheets (names, columns, index and values).
+    """
+
+    digest = hashlib.sha256()
+
+    for sheet_name, (frame, index) in sheets.items():
+        digest.update(sheet_name.encode('utf-8'))
+        digest.update(json.dumps([str(column) for column in frame.columns]).encode('utf-8'))
+        digest.update(str(frame.index.name if index else None).encode('utf-8'))
+        digest.update(pd.util.hash_pandas_object(frame, index=index).values.tobytes())
+
+    return digest.hexdigest()
+
+
+def workbook_path(period, year, week_number=None):
+    """
+    A function to name the workbook of a period.
+
+    :param period: 'all_time', 'week' or 'month_<n>'.
+    :param year: Year of the charts.
+    :param week_number: Number of the week (for the weekly workbook).
+    :return: Destination of the workbook.
+    """
+
+    if period == 'all_time':
+        return f'{alltime_folder}{year} Charts OUT All Time.xlsx'
+
+    if period == 'week':
+        return f'{weekly_folder}{year} Charts Week {week_number}.xlsx'
+
+    return f'{monthly_folder}{year} Charts Month {period.split("_")[1]}.xlsx'
+
+
+def write_sheet(workbook, sheet_name, frame, index, header_format):
+    """
+    A function to write a dataframe in a new sheet, row by row (as required by the
+    'constant_memory' mode).
+
+    :param workbook: An open xlsxwriter workbook.
+    :param sheet_name: Name of the sheet.
+    :param frame: The dataframe to write.
+    :param index: Whether the index is written as first column.
+    :param header_format: Format of the header row and of the index column.
+    """
+
+    worksheet = workbook.add_worksheet(sheet_name)
+    header = ([frame.index.name or ''] if index else []) + [str(c) for c in frame.columns]
+    offset = 1 if index else 0
+
+    worksheet.write_row(0, 0, header, header_format)
+
+    for row_number, row in enumerate(frame.itertuples(index=index, name=None), start=1):
+        if index:
+            worksheet.write(row_number, 0, cell_value(row[0]), header_format)
+
+        for col_number, value in enumerate(row[offset:], start=offset):
+            value = cell_value(value)
+
+            if value is None:
+                continue
+
+            worksheet.write(row_number, col_number, value)
+
+
+def write_workbook(path, sheets):
+    """
+    A function to write a workbook, streaming its rows to disk.
+
+    :param path: Destination of the workbook.
+    :param sheets: A dictionary associating sheet name and (dataframe, write index).
+    :return: Destination of the workbook.
+    """
+
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True,
+                                          'default_date_format': 'yyyy-mm-dd'})
+    header_format = workbook.add_format({'bold': True, 'border': 1, 'align': 'center',
+                                         'valign': 'top'})
+
+    for sheet_name, (frame, index) in sheets.items():
+        write_sheet(workbook, sheet_name, frame, index, header_format)
+
+    workbook.close()
+
+    return path
+
+
+def write_workbook_timed(path, sheets):
+    """
+    A function to write a workbook and measure how long it takes.
+
+    :param path: Destination of the workbook.
+    :param sheets: A dictionary associating sheet name and (dataframe, write index).
+    :return: Destination of the workbook and writing time, in seconds.
+    """
+
+    start = perf_counter()
+    write_workbook(path, sheets)
+
+    return path, perf_counter() - start
+
+
+def write_workbooks(jobs, max_workers=None, manifest=manifest_path):
+    """
+    A function to write the workbooks whose data changed, in parallel.
+
+    :param jobs: A list of (destination, sheets) where sheets is a dictionary associating
+    sheet name and (dataframe, write index).
+    :param max_workers: Maximum number of processes (number of CPUs by default).
+    :param manifest: JSON file keeping the hash of each workbook written.
+    :return: The list of the workbooks written (the others were unchanged).
+    """
+
+    hashes = {}
+
+    if os.path.exists(manifest):
+        with open(manifest, encoding='utf8') as manifest_file:
+            hashes = json.load(manifest_file)
+
+    to_write = []
+
+    for path, sheets in jobs:
+        digest = sheets_hash(sheets)
+
+        if hashes.get(path) == digest and os.path.exists(path):
+            print(f'Unchanged, not rewritten: {path}')
+        else:
+            to_write.append((path, sheets, digest))
+
+    timings = []
+
+    if len(to_write) == 1:
+        timings.append(write_workbook_timed(*to_write[0][:2]))
+
+    elif to_write:
+        with ProcessPoolExecutor(max_workers=min(len(to_write), max_workers or
+                                                 os.cpu_count() or 1)) as executor:
+            timings = list(executor.map(write_workbook_timed,
+                                        *zip(*[job[:2] for job in to_write])))
+
+    for path, seconds in timings:
+        run_metrics.stage_done('write_workbook', seconds, workbook=os.path.basename(path))
+
+    for path, _, digest in to_write:
+        print(f'Written: {path}')
+        hashes[path] = digest
+
+    write_atomic(manifest, json.dumps(hashes, indent=2).encode('utf-8'))
+
+    return [path for path, _, _ in to_write]